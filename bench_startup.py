@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# perf_counter() once the interpreter is up, see main.py
+STARTED = time.perf_counter()
+
+# modules that should not be loaded before the first payload
+DEFERRED = ["google.protobuf", "generated", "tkinter"]
+
+
+class Report:
+    def running(self) -> None:
+        from mitmproxy import ctx
+
+        print(
+            json.dumps(
+                {
+                    "time_to_listening": ctx.master.time_to_listening,
+                    "loaded": [m for m in DEFERRED if m in sys.modules],
+                }
+            ),
+            flush=True,
+        )
+        ctx.master.shutdown()
+
+
+async def child() -> None:
+    from gfl2logger.proxy.master import ProxyMaster
+
+    m = ProxyMaster(headless=True, started=STARTED)
+    m.options.update(mode=["regular@127.0.0.1:0"])
+    m.addons.add(Report())
+    await m.run()
+
+
+def measure(confdir: str) -> dict:
+    """Starts a proxy in a new interpreter, returns its timings in seconds."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        cwd=confdir,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = proc.stdout.readline()
+    wall = time.perf_counter() - start
+    proc.wait()
+    if not line:
+        raise RuntimeError(
+            f"proxy exited before listening, returncode={proc.returncode}"
+        )
+    return {"wall": wall, **json.loads(line)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure the time from process start until the proxy is listening"
+    )
+    parser.add_argument(
+        "-n", "--runs", type=int, default=10, help="number of measured starts"
+    )
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child())
+        return 0
+
+    with tempfile.TemporaryDirectory() as confdir:
+        # the first start fills OS and bytecode caches
+        measure(confdir)
+        runs = [measure(confdir) for _ in range(args.runs)]
+
+    for key in ("wall", "time_to_listening"):
+        values = [r[key] for r in runs]
+        print(
+            f"{key}: median={statistics.median(values):.3f}s, "
+            f"min={min(values):.3f}s, max={max(values):.3f}s"
+        )
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    print(f"loaded before listening: {', '.join(loaded) or 'none'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
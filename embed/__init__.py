@@ -1,25 +1,109 @@
-import lzma
-import pickle
-import pkgutil
+import os
 from typing import Any
 
+# Tables and resources are loaded on first attribute access, see __getattr__.
+# Tables are extracted from gfl2.xz once into a per-table pickle cache keyed
+# by the hash of gfl2.xz, later processes only unpickle the tables they use.
+# Modules needed for loading are imported on first access as well.
 
-def _load_embed(resource: str) -> Any:
-    data = pkgutil.get_data("embed", resource)
-    if data is not None:
-        return pickle.loads(lzma.decompress(data))
-    return None
+ATTACHMENT_EFFECTS: dict[int, str]
+ATTACHMENTS: dict[int, dict[str, str]]
+ATTRIBUTES_IS_PERCENT: dict[int, bool]
+ATTRIBUTES_NAME_STRIPPED: dict[int, str]
+DOLLS: dict[int, str]
+KEYS: dict[int, str]
+WEAPONS: dict[int, str]
 
+ICON_ICO: bytes | None
+ICON_PNG: bytes | None
 
-ICON_ICO = pkgutil.get_data("embed", "icon.ico")
-ICON_PNG = pkgutil.get_data("embed", "icon.png")
+TABLES = (
+    "ATTACHMENT_EFFECTS",
+    "ATTACHMENTS",
+    "ATTRIBUTES_IS_PERCENT",
+    "ATTRIBUTES_NAME_STRIPPED",
+    "DOLLS",
+    "KEYS",
+    "WEAPONS",
+)
+RESOURCES = {
+    "ICON_ICO": "icon.ico",
+    "ICON_PNG": "icon.png",
+}
 
-_GFL2: dict[str, Any] = _load_embed("gfl2.xz")
 
-ATTACHMENT_EFFECTS: dict[int, str] = _GFL2["ATTACHMENT_EFFECTS"]
-ATTACHMENTS: dict[int, dict[str, str]] = _GFL2["ATTACHMENTS"]
-ATTRIBUTES_IS_PERCENT: dict[int, bool] = _GFL2["ATTRIBUTES_IS_PERCENT"]
-ATTRIBUTES_NAME_STRIPPED: dict[int, str] = _GFL2["ATTRIBUTES_NAME_STRIPPED"]
-DOLLS: dict[int, str] = _GFL2["DOLLS"]
-KEYS: dict[int, str] = _GFL2["KEYS"]
-WEAPONS: dict[int, str] = _GFL2["WEAPONS"]
+def _cache_dir(digest: str) -> str:
+    root = (
+        os.environ.get("LOCALAPPDATA")
+        or os.environ.get("XDG_CACHE_HOME")
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(root, "gfl2logger", digest)
+
+
+def _write_cache(directory: str, tables: dict[str, Any]) -> None:
+    import pickle
+    import tempfile
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        for name in TABLES:
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(tables[name], f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, os.path.join(directory, name + ".pickle"))
+    except OSError:
+        # read-only or unavailable, tables are extracted again next time
+        pass
+
+
+def _load_table(name: str) -> Any:
+    import hashlib
+    import pickle
+    import pkgutil
+
+    data = pkgutil.get_data("embed", "gfl2.xz")
+    if data is None:
+        return None
+
+    directory = _cache_dir(hashlib.blake2b(data, digest_size=8).hexdigest())
+    try:
+        with open(os.path.join(directory, name + ".pickle"), "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    import lzma
+
+    tables: dict[str, Any] = pickle.loads(lzma.decompress(data))
+    _write_cache(directory, tables)
+    # already decompressed, keep the other tables unless replaced by update()
+    for table in TABLES:
+        globals().setdefault(table, tables[table])
+    return tables[name]
+
+
+def __getattr__(name: str) -> Any:
+    if name in TABLES:
+        value = _load_table(name)
+    elif name in RESOURCES:
+        import pkgutil
+
+        value = pkgutil.get_data("embed", RESOURCES[name])
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def update(tables: dict[str, Any]) -> None:
+    """Replaces the given tables, each one is swapped as a whole."""
+    for name in TABLES:
+        if name in tables:
+            globals()[name] = tables[name]
+
+
+def reset() -> None:
+    """Goes back to the embedded tables, loaded again on next access."""
+    for name in TABLES:
+        globals().pop(name, None)
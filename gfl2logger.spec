@@ -6,7 +6,14 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('embed', 'embed')],
-    hiddenimports=[],
+    # data modules are imported by name on the first payload of their type
+    hiddenimports=[
+        'gfl2logger.gfl2.data.attachments',
+        'gfl2logger.gfl2.data.common_keys',
+        'gfl2logger.gfl2.data.formations',
+        'gfl2logger.gfl2.data.guild_members',
+        'gfl2logger.gfl2.data.weapons',
+    ],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
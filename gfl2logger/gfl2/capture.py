@@ -0,0 +1,180 @@
+import itertools
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import BinaryIO
+
+logger = logging.getLogger(__name__)
+
+# Capture file format, all integers little endian:
+#
+#   file header   magic "GFL2CAP\0", version u16, address length u16,
+#                 start time u64 (unix ns), address (utf-8 "host:port")
+#   record        time u64 (ns since start), length u32, server bytes
+#
+# Records are appended in arrival order and are not aligned. A file cut short
+# by a crash ends at the last complete record.
+MAGIC = b"GFL2CAP\0"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sHHQ")
+RECORD_HEADER = struct.Struct("<QI")
+EXTENSION = ".gfl2cap"
+
+
+class CaptureWriter:
+    """
+    Records the server byte stream of each game flow to its own capture file.
+
+    Files are opened, appended and closed on a writer thread with buffered I/O,
+    the event loop only enqueues the received bytes.
+    """
+
+    def __init__(self, directory: str, buffer_size: int = 1 << 16):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.ids = itertools.count()
+        self.queue: queue.Queue[tuple] = queue.Queue()
+        # open files by capture id, only touched by the writer thread
+        self.files: dict[int, BinaryIO] = {}
+        # times of the first record by capture id, only touched by the writer thread
+        self.starts: dict[int, int] = {}
+        self.bytes_written = 0
+        self.thread = threading.Thread(target=self.run, name="GFL2Capture", daemon=True)
+        self.thread.start()
+
+    def open(self, address: tuple[str, int] | None) -> int:
+        capture_id = next(self.ids)
+        now = time.time_ns()
+        host, port = address if address else ("unknown", 0)
+        timestamp = datetime.fromtimestamp(now / 1e9, timezone.utc)
+        filename = os.path.join(
+            self.directory,
+            f"gfl2logger_capture_{timestamp.strftime('%Y%m%dT%H%M%SZ')}_{capture_id}{EXTENSION}",
+        )
+        self.queue.put(("open", capture_id, filename, f"{host}:{port}", now))
+        return capture_id
+
+    def record(self, capture_id: int, content: bytes, timestamp: float) -> None:
+        self.queue.put(("record", capture_id, content, int(timestamp * 1e9)))
+
+    def close(self, capture_id: int) -> None:
+        self.queue.put(("close", capture_id))
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Writes out pending records and closes all files."""
+        self.queue.shutdown()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            logger.warning(
+                f"Capture writer did not finish, pending={self.queue.qsize()}"
+            )
+
+    def run(self) -> None:
+        while True:
+            try:
+                op = self.queue.get()
+            except queue.ShutDown:
+                break
+            try:
+                self.handle(op)
+            except OSError as e:
+                logger.error(f"Failed to write capture, error={e}")
+
+        for capture_id in list(self.files):
+            self.handle(("close", capture_id))
+
+    def handle(self, op: tuple) -> None:
+        match op:
+            case ("open", capture_id, filename, address, start):
+                f = open(filename, "wb", buffering=self.buffer_size)
+                encoded = address.encode()
+                f.write(FILE_HEADER.pack(MAGIC, VERSION, len(encoded), start))
+                f.write(encoded)
+                self.files[capture_id] = f
+                self.starts[capture_id] = start
+                logger.info(f"Capturing {address} to {filename}")
+            case ("record", capture_id, content, timestamp):
+                f = self.files.get(capture_id)
+                if f is None:
+                    return
+                elapsed = max(timestamp - self.starts[capture_id], 0)
+                f.write(RECORD_HEADER.pack(elapsed, len(content)))
+                f.write(content)
+                self.bytes_written += RECORD_HEADER.size + len(content)
+            case ("close", capture_id):
+                f = self.files.pop(capture_id, None)
+                self.starts.pop(capture_id, None)
+                if f is not None:
+                    f.close()
+
+
+class CaptureReader:
+    """
+    Memory maps a capture file. Records are returned as views into the map,
+    which must be released before the reader is closed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.map) < FILE_HEADER.size:
+            self.map.close()
+            raise ValueError(f"{path} is not a capture file")
+        magic, version, address_len, start = FILE_HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a capture file, version={version}")
+
+        self.start = start
+        self.address = bytes(
+            self.map[FILE_HEADER.size : FILE_HEADER.size + address_len]
+        ).decode()
+        # offset of the first record
+        self.offset = FILE_HEADER.size + address_len
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.map.close()
+
+    def records(self, offset: int | None = None) -> Iterator[tuple[int, memoryview]]:
+        """Yields (ns since start, bytes) from offset, the first record by default."""
+        view = memoryview(self.map)
+        pos = self.offset if offset is None else offset
+        end = len(self.map)
+        try:
+            while pos + RECORD_HEADER.size <= end:
+                elapsed, length = RECORD_HEADER.unpack_from(view, pos)
+                pos += RECORD_HEADER.size
+                if pos + length > end:
+                    logger.warning(f"Truncated capture record, path={self.path}")
+                    return
+                yield elapsed, view[pos : pos + length]
+                pos += length
+        finally:
+            view.release()
+
+    def offsets(self) -> list[int]:
+        """Offsets of every record, for seeking with records(offset)."""
+        result = []
+        pos = self.offset
+        end = len(self.map)
+        while pos + RECORD_HEADER.size <= end:
+            _, length = RECORD_HEADER.unpack_from(self.map, pos)
+            if pos + RECORD_HEADER.size + length > end:
+                break
+            result.append(pos)
+            pos += RECORD_HEADER.size + length
+        return result
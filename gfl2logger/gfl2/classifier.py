@@ -0,0 +1,109 @@
+import ipaddress
+import logging
+from collections.abc import Iterable
+
+from mitmproxy import exceptions
+
+from gfl2logger.gfl2.parser import PAYLOAD_HEADER, FrameBuffer
+
+logger = logging.getLogger(__name__)
+
+# bytes buffered without a verdict before giving up on a flow, a few frames
+# of the largest size
+SNIFF_MAX = 4 * (FrameBuffer.HEADER_LEN + 0xFFFF)
+
+IPAddress = ipaddress.IPv4Address | ipaddress.IPv6Address
+ServerRule = tuple[IPAddress | None, int | None]
+
+
+def sniff(head: bytes) -> bool | None:
+    """
+    Classifies a flow from the first bytes sent by the server.
+
+    Returns True once a complete frame with at least one payload checks out,
+    False for anything else and None while more bytes are needed. Empty frames
+    are inconclusive, the verdict is taken from the next ones.
+    """
+    # TLS handshake/alert/application data records
+    if len(head) >= 2 and head[0] in (0x15, 0x16, 0x17) and head[1] == 0x03:
+        return False
+    if head[:5] in (b"HTTP/", b"SSH-2"):
+        return False
+
+    i = 0
+    while len(head) - i >= FrameBuffer.HEADER_LEN:
+        body = i + FrameBuffer.HEADER_LEN
+        frame_end = body + int.from_bytes(head[i + 3 : i + 5], "little")
+
+        # every payload header available within the frame must fit inside it
+        j = body
+        end = min(len(head), frame_end)
+        while j + PAYLOAD_HEADER.size <= end:
+            _, length = PAYLOAD_HEADER.unpack_from(head, j)
+            j += PAYLOAD_HEADER.size + length
+            if j > frame_end:
+                return False
+
+        # wait for the rest of the frame
+        if frame_end > len(head):
+            return None
+
+        # payloads of a complete frame must add up to its length exactly
+        if j != frame_end:
+            return False
+        if j > body:
+            return True
+        i = frame_end
+
+    return None
+
+
+def parse_ip(host: str) -> IPAddress:
+    ip = ipaddress.ip_address(host)
+    # dual-stack sockets report IPv4 peers as mapped IPv6 addresses
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        return ip.ipv4_mapped
+    return ip
+
+
+def parse_server_rules(specs: Iterable[str]) -> list[ServerRule]:
+    """
+    Parses "ip", ":port" and "ip:port" specs, with IPv6 addresses in brackets
+    when followed by a port ("[::1]:443"). Flows in local mode only know the
+    server IP, host names are rejected instead of never matching.
+    """
+    rules: list[ServerRule] = []
+    for spec in specs:
+        host, port = spec.strip(), ""
+        if host.startswith("["):
+            host, sep, port = host[1:].partition("]")
+            if not sep or (port and not port.startswith(":")):
+                raise exceptions.OptionsError(f"Invalid game server: {spec}")
+            port = port[1:]
+        elif host.count(":") == 1:
+            host, _, port = host.partition(":")
+        try:
+            ip = parse_ip(host) if host else None
+            number = int(port) if port else None
+        except ValueError:
+            raise exceptions.OptionsError(
+                f"Invalid game server: {spec}, expected an IP address and/or a port"
+            )
+        if number is not None and not 0 < number < 65536:
+            raise exceptions.OptionsError(f"Invalid game server port: {spec}")
+        rules.append((ip, number))
+    return rules
+
+
+def match_server(rules: Iterable[ServerRule], address: tuple[str, int] | None) -> bool:
+    if address is None:
+        return False
+    try:
+        ip = parse_ip(address[0])
+    except ValueError:
+        # a host name, only in proxy modes where the client sends one
+        ip = None
+    for host, port in rules:
+        if (host is None or host == ip) and (port is None or port == address[1]):
+            return True
+    return False
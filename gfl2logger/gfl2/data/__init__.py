@@ -1,30 +1,132 @@
-from collections.abc import Generator
+import importlib
+from collections.abc import Generator, Iterator, Mapping
 from typing import Any
 
 from mitmproxy import addonmanager
 
-from gfl2logger.gfl2.data.attachments import AttachmentsData
 from gfl2logger.gfl2.data.base import BaseData
-from gfl2logger.gfl2.data.common_keys import CommonKeysData
-from gfl2logger.gfl2.data.formations import FormationsData
-from gfl2logger.gfl2.data.guild_members import GuildMembersData
-from gfl2logger.gfl2.data.weapons import WeaponsData
-
-DATA_TYPES: dict[int, type[BaseData]] = {
-    11021: WeaponsData,
-    11061: AttachmentsData,
-    11138: CommonKeysData,
-    21917: GuildMembersData,
-    23201: FormationsData,
+
+# Data types by payload type id. Modules are imported on the first payload of
+# their type, which keeps protobuf and the generated modules out of startup.
+# Options are declared here so they are known without importing the modules.
+REGISTRY: dict[int, dict[str, Any]] = {
+    11021: {
+        "module": "gfl2logger.gfl2.data.weapons",
+        "class": "WeaponsData",
+        "options": [
+            {
+                "name": "gfl2_weapons",
+                "label": "Weapons",
+                "typespec": bool,
+                "default": True,
+                "help": "Log weapons on login",
+            }
+        ],
+    },
+    11061: {
+        "module": "gfl2logger.gfl2.data.attachments",
+        "class": "AttachmentsData",
+        "options": [
+            {
+                "name": "gfl2_attachments",
+                "label": "Attachments",
+                "typespec": bool,
+                "default": True,
+                "help": "Log Attachments on login",
+            }
+        ],
+    },
+    11138: {
+        "module": "gfl2logger.gfl2.data.common_keys",
+        "class": "CommonKeysData",
+        "options": [
+            {
+                "name": "gfl2_commonkeys",
+                "label": "Common Keys",
+                "typespec": bool,
+                "default": True,
+                "help": "Log Common Keys on login",
+            }
+        ],
+    },
+    21917: {
+        "module": "gfl2logger.gfl2.data.guild_members",
+        "class": "GuildMembersData",
+        "options": [
+            {
+                "name": "gfl2_guildmembers",
+                "label": "Platoon members",
+                "typespec": bool,
+                "default": True,
+                "help": "Log Platoon members on login/Platoon page",
+            }
+        ],
+    },
+    23201: {
+        "module": "gfl2logger.gfl2.data.formations",
+        "class": "FormationsData",
+        "options": [
+            {
+                "name": "gfl2_formations",
+                "label": "Formations",
+                "typespec": bool,
+                "default": True,
+                "help": "Log Formations on login",
+            },
+            {
+                "name": "gfl2_formations_resolve",
+                "label": "Resolve Formations",
+                "typespec": bool,
+                "default": True,
+                "help": "Include weapon, attachment and Common Key details in Formations",
+            },
+        ],
+    },
 }
 
 
+class DataTypes(Mapping[int, type[BaseData]]):
+    """
+    Data classes by payload type id. Membership only checks the registry, the
+    module of a type is imported when its class is first looked up.
+    """
+
+    def __init__(self, registry: dict[int, dict[str, Any]]):
+        self.registry = registry
+        self.loaded: dict[int, type[BaseData]] = {}
+
+    def __getitem__(self, type_id: int) -> type[BaseData]:
+        cls = self.loaded.get(type_id)
+        if cls is None:
+            entry = self.registry[type_id]
+            module = importlib.import_module(entry["module"])
+            cls = self.loaded[type_id] = getattr(module, entry["class"])
+        return cls
+
+    def __contains__(self, type_id: object) -> bool:
+        return type_id in self.registry
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.registry)
+
+    def __len__(self) -> int:
+        return len(self.registry)
+
+
+DATA_TYPES = DataTypes(REGISTRY)
+
+
 def get_options() -> Generator[dict[str, Any]]:
-    for d in DATA_TYPES.values():
-        for o in d.OPTIONS:
-            yield o
+    for entry in REGISTRY.values():
+        yield from entry["options"]
 
 
 def add_options(loader: addonmanager.Loader) -> None:
-    for DataClass in DATA_TYPES.values():
-        DataClass.add_options(loader)
+    for opt in get_options():
+        if "name" in opt:
+            loader.add_option(
+                name=opt["name"],
+                typespec=opt.get("typespec", bool),
+                default=opt.get("default", True),
+                help=opt.get("help", ""),
+            )
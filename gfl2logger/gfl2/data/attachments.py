@@ -1,120 +1,149 @@
-import asyncio
-import csv
-import itertools
+import array
 import logging
-from collections.abc import Generator, Iterable
+import sys
+from collections.abc import Generator, Sequence
 from typing import Any
 
-from google.protobuf import json_format
-from mitmproxy import ctx, log
+from mitmproxy import ctx
 
-from embed import (
-    ATTACHMENT_EFFECTS,
-    ATTACHMENTS,
-    ATTRIBUTES_IS_PERCENT,
-    ATTRIBUTES_NAME_STRIPPED,
-)
-from generated.attachments_pb2 import Attachments
+import embed
+from generated.attachments_pb2 import Attachment, Attachments
 from gfl2logger.gfl2.data.base import BaseData
+from gfl2logger.gfl2.data.fields import RowExtractor
+from gfl2logger.gfl2.inventory import INVENTORY
 
 logger = logging.getLogger(__name__)
 
 
 class AttachmentsData(BaseData):
-    OPTIONS = [
-        {
-            "name": "gfl2_attachments",
-            "label": "Attachments",
-            "typespec": bool,
-            "default": True,
-            "help": "Log Attachments on login",
+    NAME = "attachments"
+    LABEL = "Attachments"
+    FORMAT = "csv"
+
+    ROW = RowExtractor(
+        Attachment.DESCRIPTOR,
+        [
+            "uid",
+            "part_id",
+            "effect.id",
+            "is_locked",
+            "weapon_uid",
+            "attributes",
+            "calibrations.boost",
+        ],
+        raw=["is_locked", "attributes"],
+    )
+
+    @classmethod
+    def columns(cls) -> dict[str, str]:
+        return {
+            "uid": "TEXT",
+            "name": "TEXT",
+            "rarity": "TEXT",
+            "type": "TEXT",
+            "effect": "TEXT",
+            **{
+                "attr" + attr: "REAL"
+                for attr in embed.ATTRIBUTES_NAME_STRIPPED.values()
+            },
+            **{
+                "calib" + attr: "REAL"
+                for attr in embed.ATTRIBUTES_NAME_STRIPPED.values()
+            },
+            "isLocked": "INTEGER",
+            "weaponUid": "TEXT",
         }
-    ]
 
     @staticmethod
-    def decode_attributes(attrs: int) -> Generator[dict[str, Any]]:
-        for val, attr in itertools.batched(attrs.to_bytes(8, byteorder="little"), n=2):
-            if attr == 0:
-                break
-
-            attr_name = ATTRIBUTES_NAME_STRIPPED.get(attr, str(attr))
-            attr_is_percent = ATTRIBUTES_IS_PERCENT.get(attr, False)
-
-            yield {"name": attr_name, "value": val / 10 if attr_is_percent else val}
+    def attribute_columns() -> list[tuple[str, str, bool]]:
+        """(attr column, calib column, is percent) indexed by attribute id."""
+        names = embed.ATTRIBUTES_NAME_STRIPPED
+        is_percent = embed.ATTRIBUTES_IS_PERCENT
+        columns = []
+        for attr in range(256):
+            attr_name = names.get(attr, str(attr))
+            columns.append(
+                (
+                    "attr" + attr_name,
+                    "calib" + attr_name,
+                    is_percent.get(attr, False),
+                )
+            )
+        return columns
 
     @staticmethod
-    def map_attributes_calibrations(
-        attributes: Iterable[dict[str, Any]], calibrations: Iterable[dict[str, Any]]
-    ) -> Generator[tuple[str, Any]]:
-        for attr, calib in itertools.zip_longest(
-            attributes, calibrations, fillvalue={}
-        ):
-            attr_name = attr.get("name")
-            if not isinstance(attr_name, str):
-                continue
-
-            calib_boost = calib.get("boost")
-            if isinstance(calib_boost, int):
-                calib_boost /= 10
-
-            yield ("attr" + attr_name, attr.get("value"))
-            yield ("calib" + attr_name, calib_boost)
-
-    async def export(self) -> None:
-        if ctx.options.gfl2_attachments:
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, self.to_csv)
-
-    def to_raw_dicts(self) -> Generator[dict[str, Any]]:
-        for b in self.data:
-            attachments = Attachments()
-            attachments.ParseFromString(b)
-            yield json_format.MessageToDict(attachments)
-
-    def to_dicts(self) -> Generator[dict[str, Any]]:
-        for data in self.to_raw_dicts():
-            for row in data["attachments"]:
-                part_id = row.get("partId")
-                yield {
-                    "uid": row.get("uid"),
-                    "name": ATTACHMENTS.get(part_id, {}).get("name", part_id),
-                    "rarity": ATTACHMENTS.get(part_id, {}).get("rarity"),
-                    "type": ATTACHMENTS.get(part_id, {}).get("type"),
-                    "effect": ATTACHMENT_EFFECTS.get(row.get("effect", {}).get("id")),
-                    "isLocked": row.get("isLocked", False),
-                    "weaponUid": row.get("weaponUid"),
-                    **dict(
-                        AttachmentsData.map_attributes_calibrations(
-                            AttachmentsData.decode_attributes(
-                                int(row.get("attributes", 0))
-                            ),
-                            row.get("calibrations", []),
-                        ),
-                    ),
-                }
-
-    def to_csv(self) -> None:
-        filename = (
-            f"gfl2logger_attachments_{self.log_time.strftime('%Y%m%dT%H%M%SZ')}.csv"
+    def decode_attributes(
+        attributes: Sequence[int], calibrations: Sequence[list[int | None] | None]
+    ) -> list[dict[str, Any]]:
+        """
+        Decodes the packed attributes of many attachments at once. Each 64-bit value holds
+        up to 4 little-endian (value, attribute id) byte pairs, terminated by id 0.
+        Returns the attr*/calib* columns of every attachment.
+        """
+        packed = array.array("Q", attributes)
+        if sys.byteorder != "little":
+            packed.byteswap()
+        raw = packed.tobytes()
+        vals = raw[0::2]
+        ids = raw[1::2]
+
+        columns = AttachmentsData.attribute_columns()
+        rows = []
+        for i, calibs in enumerate(calibrations):
+            calibs = calibs or ()
+            row = {}
+            for j in range(4):
+                attr = ids[4 * i + j]
+                if attr == 0:
+                    break
+
+                attr_col, calib_col, is_percent = columns[attr]
+                val = vals[4 * i + j]
+                calib_boost = calibs[j] if j < len(calibs) else None
+
+                row[attr_col] = val / 10 if is_percent else val
+                row[calib_col] = calib_boost / 10 if calib_boost is not None else None
+            rows.append(row)
+        return rows
+
+    def enabled(self) -> bool:
+        return ctx.options.gfl2_attachments
+
+    def indexed(self) -> bool:
+        return ctx.options.gfl2_formations and ctx.options.gfl2_formations_resolve
+
+    def decode(self, b: bytes) -> list[dict[str, Any]]:
+        attachments = Attachments()
+        attachments.ParseFromString(b)
+        return list(self.to_rows(attachments))
+
+    def index(self, rows: list[dict[str, Any]], new: bool) -> None:
+        INVENTORY.update("attachments", rows, new)
+
+    def to_rows(self, attachments: Attachments) -> Generator[dict[str, Any]]:
+        rows = list(map(self.ROW, attachments.attachments))
+        attrs = AttachmentsData.decode_attributes(
+            [row[5] for row in rows], [row[6] for row in rows]
         )
-        cols = [
-            "uid",
-            "name",
-            "rarity",
-            "type",
-            "effect",
-            *["attr" + attr for attr in ATTRIBUTES_NAME_STRIPPED.values()],
-            *["calib" + attr for attr in ATTRIBUTES_NAME_STRIPPED.values()],
-            "isLocked",
-            "weaponUid",
-        ]
-        data = self.to_dicts()
-
-        try:
-            with open(filename, "w", encoding="utf-8", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
-                writer.writeheader()
-                writer.writerows(data)
-            logger.log(log.ALERT, f"Attachments data written to {filename}")
-        except OSError as e:
-            logger.error(f"Failed to write to {filename}, error={e}")
+        parts = embed.ATTACHMENTS
+        effects = embed.ATTACHMENT_EFFECTS
+        for (
+            uid,
+            part_id,
+            effect_id,
+            is_locked,
+            weapon_uid,
+            _,
+            _,
+        ), row_attrs in zip(rows, attrs):
+            part = parts.get(part_id, {})
+            yield {
+                "uid": uid,
+                "name": part.get("name", part_id),
+                "rarity": part.get("rarity"),
+                "type": part.get("type"),
+                "effect": effects.get(effect_id),
+                "isLocked": is_locked,
+                "weaponUid": weapon_uid,
+                **row_attrs,
+            }
@@ -1,33 +1,179 @@
+import hashlib
 import logging
+import time
+from collections.abc import Generator, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Any
 
-from mitmproxy import addonmanager
+from mitmproxy import log
+
+from gfl2logger.gfl2 import metrics, writers
 
 logger = logging.getLogger(__name__)
 
+# chunks are decoded in arrival order on a single worker
+DECODER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="GFL2Decoder")
+
 
 class BaseData:
-    OPTIONS: list[dict[str, Any]] = []
+    # used in output file and table names
+    NAME = "base"
+    # used in log messages
+    LABEL = "Base"
+    # default output format, see writers.WRITERS, or None to only log the payload
+    FORMAT: str | None = None
+    # output columns and their SQLite types
+    COLUMNS: dict[str, str] = {}
+    # columns that change on every export and are ignored when comparing rows
+    VOLATILE_COLUMNS: tuple[str, ...] = ()
 
     @classmethod
-    def add_options(cls, loader: addonmanager.Loader) -> None:
-        for opt in cls.OPTIONS:
-            if "name" in opt:
-                loader.add_option(
-                    name=opt["name"],
-                    typespec=opt.get("typespec", bool),
-                    default=opt.get("default", True),
-                    help=opt.get("help", ""),
-                )
-
-    def __init__(self, b: bytes):
-        self.data = [b]
+    def columns(cls) -> dict[str, str]:
+        return cls.COLUMNS
+
+    def __init__(self, b: bytes, part: int = 0):
+        self.data: list[bytes] = []
+        # rows of each chunk, decoded as soon as it is appended
+        self.decoded: list[Future[list[dict[str, Any]]] | None] = []
         self.log_time = datetime.now(timezone.utc)
+        # monotonic arrival time of the first chunk
+        self.arrival = time.monotonic()
+        # monotonic times through the pipeline, see trace.TraceLog
+        self.last_arrival = self.arrival
+        self.submitted = 0.0
+        self.dispatched = 0.0
+        self.started = 0.0
+        self.written = 0.0
+        # seconds spent decoding chunks on the decoder thread
+        self.decode_time = 0.0
+        self.size = 0
+        # number of this piece of a message flushed in pieces over the size
+        # limit, 0 for a whole message; pieces are not superseded, deduplicated
+        # or compared
+        self.part = part
+        self.append(b)
 
     def append(self, b: bytes):
+        # the first chunk of a snapshot, later pieces continue the first one
+        new = not self.data and self.part <= 1
+        self.last_arrival = time.monotonic()
         self.data.append(b)
+        self.size += len(b)
+        if self.enabled() or self.indexed():
+            metrics.DECODES_SUBMITTED[self.__class__.__name__] += 1
+            self.decoded.append(DECODER.submit(self.timed_decode, b, new))
+        else:
+            self.decoded.append(None)
+
+    def enabled(self) -> bool:
+        return False
+
+    def indexed(self) -> bool:
+        """
+        Whether decoded rows are needed by the inventory or the member history
+        even if not exported.
+        """
+        return False
+
+    def decode(self, b: bytes) -> list[dict[str, Any]]:
+        return []
+
+    def index(self, rows: list[dict[str, Any]], new: bool) -> None:
+        """
+        Adds decoded rows to the inventory, new when they start a snapshot.
+        Only called on the decoder thread, chunks decoded inline on export are
+        not indexed.
+        """
+
+    def timed_decode(self, b: bytes, new: bool = False) -> list[dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            rows = self.decode(b)
+            self.index(rows, new)
+            return rows
+        finally:
+            elapsed = time.perf_counter() - start
+            self.decode_time += elapsed
+            metrics.DECODE_SECONDS[self.__class__.__name__].observe(elapsed)
 
-    async def export(self) -> None:
+    def to_dicts(self) -> Generator[dict[str, Any]]:
+        for b, decoded in zip(self.data, self.decoded):
+            yield from decoded.result() if decoded is not None else self.decode(b)
+
+    def digest(self) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
         for b in self.data:
-            logger.debug(b.hex())
+            h.update(len(b).to_bytes(4, "little"))
+            h.update(b)
+        return h.digest()
+
+    def delta(
+        self, previous: dict[Any, dict[str, Any]], current: dict[Any, dict[str, Any]]
+    ) -> Generator[dict[str, Any]]:
+        """Rows added, removed or changed since previous, both keyed by uid."""
+        ignored = self.VOLATILE_COLUMNS
+        for uid, row in current.items():
+            old = previous.get(uid)
+            if old is None:
+                yield {"change": "added", **row}
+            elif any(row.get(c) != old.get(c) for c in row if c not in ignored):
+                yield {"change": "changed", **row}
+        for uid, row in previous.items():
+            if uid not in current:
+                yield {"change": "removed", **row}
+
+    def write_rows(
+        self,
+        rows: Iterable[dict[str, Any]],
+        cols: list[str],
+        label: str,
+        format: str = "default",
+        compression: str = "none",
+        suffix: str = "",
+    ) -> bool:
+        """Writes rows to a new file, returns whether it was written."""
+        format = self.FORMAT if format == "default" else format
+        if self.part:
+            suffix = f"_part{self.part}{suffix}"
+        filename = (
+            f"gfl2logger_{self.NAME}_{self.log_time.strftime('%Y%m%dT%H%M%SZ')}{suffix}"
+        )
+
+        try:
+            filename = writers.write(filename, rows, cols, format, compression)
+            logger.log(log.ALERT, f"{label} written to {filename}")
+        except OSError as e:
+            logger.error(f"Failed to write to {filename}, error={e}")
+            return False
+        return True
+
+    def write_delta(
+        self,
+        previous: dict[Any, dict[str, Any]],
+        current: dict[Any, dict[str, Any]],
+        format: str = "default",
+        compression: str = "none",
+    ) -> bool:
+        return self.write_rows(
+            self.delta(previous, current),
+            ["change", *self.columns()],
+            f"{self.LABEL} delta",
+            "csv" if format == "default" else format,
+            compression,
+            "_delta",
+        )
+
+    def write(self, format: str = "default", compression: str = "none") -> bool:
+        if self.FORMAT is None:
+            for b in self.data:
+                logger.debug(b.hex())
+            return True
+
+        return self.write_rows(
+            self.to_dicts(),
+            list(self.columns()),
+            f"{self.LABEL} data",
+            format,
+            compression,
+        )
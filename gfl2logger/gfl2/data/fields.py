@@ -0,0 +1,79 @@
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+from google.protobuf.message import Message
+
+# 64-bit integers are strings in json_format.MessageToDict
+INT64_TYPES = {
+    FieldDescriptor.TYPE_INT64,
+    FieldDescriptor.TYPE_UINT64,
+    FieldDescriptor.TYPE_SINT64,
+    FieldDescriptor.TYPE_FIXED64,
+    FieldDescriptor.TYPE_SFIXED64,
+}
+
+Getter = Callable[[Message], Any]
+
+
+def is_repeated(field: FieldDescriptor) -> bool:
+    if hasattr(field, "is_repeated"):
+        return field.is_repeated
+    return field.label == FieldDescriptor.LABEL_REPEATED
+
+
+def compile_field(descriptor: Descriptor, path: str, raw: bool = False) -> Getter:
+    """
+    Compiles a dotted path of proto field names into a getter.
+
+    Values follow json_format.MessageToDict: fields with default values, empty
+    repeated fields and absent messages are None and 64-bit integers are strings.
+    Repeated messages in the middle of a path map the rest of the path over each element.
+    A path ending at a message field returns the message(s) themselves.
+    If raw is set, a scalar leaf is returned as is.
+    """
+    name, _, rest = path.partition(".")
+    field = descriptor.fields_by_name.get(name)
+    if field is None:
+        raise ValueError(f"unknown field {name} in {descriptor.full_name}")
+
+    if field.type == FieldDescriptor.TYPE_MESSAGE:
+        if rest:
+            sub = compile_field(field.message_type, rest, raw)
+            if is_repeated(field):
+                return lambda m: [sub(x) for x in getattr(m, name)] or None
+            return lambda m: sub(getattr(m, name)) if m.HasField(name) else None
+        if is_repeated(field):
+            return lambda m: list(getattr(m, name)) or None
+        return lambda m: getattr(m, name) if m.HasField(name) else None
+
+    if rest:
+        raise ValueError(f"scalar field {name} in {descriptor.full_name} has no {rest}")
+
+    stringify = field.type in INT64_TYPES and not raw
+    if is_repeated(field):
+        if stringify:
+            return lambda m: [str(v) for v in getattr(m, name)] or None
+        return lambda m: list(getattr(m, name)) or None
+    if raw:
+        return lambda m: getattr(m, name)
+    if stringify:
+        return lambda m: str(v) if (v := getattr(m, name)) else None
+    return lambda m: v if (v := getattr(m, name)) else None
+
+
+class RowExtractor:
+    """
+    Reads a fixed set of fields from a message into a tuple, without building
+    an intermediate dict tree through json_format.
+    """
+
+    def __init__(
+        self, descriptor: Descriptor, paths: Iterable[str], raw: Iterable[str] = ()
+    ):
+        raw = set(raw)
+        self.paths = list(paths)
+        self.getters = [compile_field(descriptor, p, p in raw) for p in self.paths]
+
+    def __call__(self, message: Message) -> tuple[Any, ...]:
+        return tuple([g(message) for g in self.getters])
@@ -1,81 +1,146 @@
-import asyncio
+import hashlib
 import json
 import logging
 from collections.abc import Generator, Iterable
 from typing import Any
 
-from google.protobuf import json_format
-from mitmproxy import ctx, log
+from mitmproxy import ctx
 
-from embed import DOLLS, KEYS
-from generated.formations_pb2 import FormationsResponse
+import embed
+from generated.formations_pb2 import Doll, Formation, FormationsResponse
 from gfl2logger.gfl2.data.base import BaseData
+from gfl2logger.gfl2.data.fields import RowExtractor
+from gfl2logger.gfl2.inventory import INVENTORY
 
 logger = logging.getLogger(__name__)
 
 
 class FormationsData(BaseData):
-    OPTIONS = [
-        {
-            "name": "gfl2_formations",
-            "label": "Formations",
-            "typespec": bool,
-            "default": True,
-            "help": "Log Formations on login",
-        }
-    ]
+    NAME = "formations"
+    LABEL = "Formations"
+    FORMAT = "json"
+    COLUMNS = {
+        "name": "TEXT",
+        "dolls": "TEXT",
+    }
+
+    FORMATIONS = RowExtractor(FormationsResponse.DESCRIPTOR, ["formations.formations"])
+    FORMATION = RowExtractor(Formation.DESCRIPTOR, ["name", "dolls"])
+    DOLL = RowExtractor(
+        Doll.DESCRIPTOR,
+        [
+            "doll_id",
+            "weapon_uid",
+            "attachment_uids",
+            "fixed_key_ids",
+            "expansion_key_ids",
+            "common_key_uids",
+        ],
+    )
 
     @staticmethod
-    def map_dolls(dolls: Iterable[dict[str, Any]]) -> Generator[dict[str, Any]]:
+    def map_dolls(dolls: Iterable[Doll]) -> Generator[dict[str, Any]]:
+        names = embed.DOLLS
+        keys = embed.KEYS
         for doll in dolls:
-            if not doll:
-                yield doll
+            # no fields set
+            if not doll.ListFields():
+                yield {}
                 continue
 
+            (
+                doll_id,
+                weapon_uid,
+                attachment_uids,
+                fixed_key_ids,
+                expansion_key_ids,
+                common_key_uids,
+            ) = FormationsData.DOLL(doll)
             yield {
-                "name": DOLLS.get(doll.get("dollId", -1)),
-                "weaponUid": doll.get("weaponUid"),
-                "attachmentUids": doll.get("attachmentUids", []),
-                "fixedKeys": [
-                    KEYS.get(id, "-") for id in doll.get("fixedKeyIds", [0, 0, 0])
-                ],
-                "expansionKeys": [
-                    KEYS.get(id, "-") for id in doll.get("expansionKeyIds", [0])
-                ],
-                "commonKeyUids": [
-                    id for id in doll.get("commonKeyUids", ["0", "0", "0"])
-                ],
+                "name": names.get(-1 if doll_id is None else doll_id),
+                "weaponUid": weapon_uid,
+                "attachmentUids": attachment_uids or [],
+                "fixedKeys": [keys.get(id, "-") for id in fixed_key_ids or [0, 0, 0]],
+                "expansionKeys": [keys.get(id, "-") for id in expansion_key_ids or [0]],
+                "commonKeyUids": common_key_uids or ["0", "0", "0"],
             }
 
-    async def export(self) -> None:
-        if ctx.options.gfl2_formations:
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, self.to_json)
+    @staticmethod
+    def resolve_doll(doll: dict[str, Any]) -> dict[str, Any]:
+        """Adds the details of the items a doll uses after their uids."""
+        if not doll:
+            return doll
+
+        resolved = {}
+        for k, v in doll.items():
+            resolved[k] = v
+            match k:
+                case "weaponUid":
+                    weapon = INVENTORY.weapons.get(v)
+                    resolved["weapon"] = (
+                        {c: weapon.get(c) for c in ("name", "level", "rank")}
+                        if weapon
+                        else None
+                    )
+                case "attachmentUids":
+                    resolved["attachments"] = [
+                        FormationsData.attachment_details(
+                            INVENTORY.attachments.get(uid)
+                        )
+                        for uid in v
+                    ]
+                case "commonKeyUids":
+                    resolved["commonKeys"] = [
+                        key.get("name")
+                        if (key := INVENTORY.common_keys.get(uid))
+                        else None
+                        for uid in v
+                    ]
+        return resolved
+
+    @staticmethod
+    def attachment_details(row: dict[str, Any] | None) -> dict[str, Any] | None:
+        if row is None:
+            return None
+        return {
+            k: v
+            for k, v in row.items()
+            if v is not None and k not in ("uid", "weaponUid", "isLocked")
+        }
+
+    def enabled(self) -> bool:
+        return ctx.options.gfl2_formations
 
-    def to_raw_dicts(self) -> Generator[dict[str, Any]]:
-        for b in self.data:
-            formations = FormationsResponse()
-            formations.ParseFromString(b)
-            yield json_format.MessageToDict(formations)
+    def digest(self) -> bytes:
+        # resolved output also depends on the inventory, not only on the chunks
+        if not ctx.options.gfl2_formations_resolve:
+            return super().digest()
+        h = hashlib.blake2b(digest_size=16)
+        for row in self.to_dicts():
+            h.update(json.dumps(row, sort_keys=True, default=str).encode())
+        return h.digest()
 
     def to_dicts(self) -> Generator[dict[str, Any]]:
-        for data in self.to_raw_dicts():
-            for row in data["formations"]["formations"]:
-                output = {
-                    "name": row.get("name"),
-                    "dolls": list(FormationsData.map_dolls(row.get("dolls", []))),
-                }
-                yield {k: output[k] for k in output if output[k]}
-
-    def to_json(self) -> None:
-        filename = (
-            f"gfl2logger_formations_{self.log_time.strftime('%Y%m%dT%H%M%SZ')}.json"
-        )
-        data = list(self.to_dicts())
-
-        try:
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logger.log(log.ALERT, f"Formations data written to {filename}")
-        except OSError as e:
-            logger.error(f"Failed to write to {filename}, error={e}")
+        # items are resolved on export, they may be decoded after the formations
+        if not ctx.options.gfl2_formations_resolve:
+            yield from super().to_dicts()
+            return
+        for row in super().to_dicts():
+            if "dolls" not in row:
+                yield row
+                continue
+            yield {**row, "dolls": [self.resolve_doll(d) for d in row["dolls"]]}
+
+    def decode(self, b: bytes) -> list[dict[str, Any]]:
+        formations = FormationsResponse()
+        formations.ParseFromString(b)
+        return list(self.to_rows(formations))
+
+    def to_rows(self, formations: FormationsResponse) -> Generator[dict[str, Any]]:
+        (rows,) = self.FORMATIONS(formations)
+        for name, dolls in map(self.FORMATION, rows or []):
+            output = {
+                "name": name,
+                "dolls": list(FormationsData.map_dolls(dolls or [])),
+            }
+            yield {k: output[k] for k in output if output[k]}
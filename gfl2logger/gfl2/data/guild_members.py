@@ -1,79 +1,79 @@
-import asyncio
-import csv
 import logging
 from collections.abc import Generator
 from typing import Any
 
-from google.protobuf import json_format
-from mitmproxy import ctx, log
+from mitmproxy import ctx
 
-from generated.guild_members_pb2 import GuildMembers
+from generated.guild_members_pb2 import GuildMember, GuildMembers
 from gfl2logger.gfl2.data.base import BaseData
+from gfl2logger.gfl2.data.fields import RowExtractor
 
 logger = logging.getLogger(__name__)
 
 
 class GuildMembersData(BaseData):
-    OPTIONS = [
-        {
-            "name": "gfl2_guildmembers",
-            "label": "Platoon members",
-            "typespec": bool,
-            "default": True,
-            "help": "Log Platoon members on login/Platoon page",
-        }
-    ]
+    NAME = "guildmembers"
+    LABEL = "Guild members"
+    FORMAT = "csv"
+    COLUMNS = {
+        "uid": "INTEGER",
+        "name": "TEXT",
+        "level": "INTEGER",
+        "weeklyMerit": "INTEGER",
+        "totalMerit": "INTEGER",
+        "highScore": "INTEGER",
+        "totalScore": "INTEGER",
+        "lastLogin": "INTEGER",
+        "logTime": "TEXT",
+    }
+    VOLATILE_COLUMNS = ("logTime",)
 
-    async def export(self) -> None:
-        if ctx.options.gfl2_guildmembers:
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, self.to_csv)
+    ROW = RowExtractor(
+        GuildMember.DESCRIPTOR,
+        [
+            "uid",
+            "player.player_info.name",
+            "player.player_info.level",
+            "weekly_merit",
+            "total_merit",
+            "high_score",
+            "total_score",
+            "last_login",
+        ],
+    )
 
-    def to_raw_dicts(self) -> Generator[dict[str, Any]]:
-        for b in self.data:
-            members = GuildMembers()
-            members.ParseFromString(b)
-            yield json_format.MessageToDict(members)
+    def enabled(self) -> bool:
+        return ctx.options.gfl2_guildmembers
 
-    def to_dicts(self) -> Generator[dict[str, Any]]:
-        log_time_8601 = self.log_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    def indexed(self) -> bool:
+        return bool(ctx.options.gfl2_member_history)
 
-        for data in self.to_raw_dicts():
-            for row in data["members"]:
-                yield {
-                    "uid": row.get("uid"),
-                    "name": row.get("player", {}).get("playerInfo", {}).get("name"),
-                    "level": row.get("player", {}).get("playerInfo", {}).get("level"),
-                    "weeklyMerit": row.get("weeklyMerit"),
-                    "totalMerit": row.get("totalMerit"),
-                    "highScore": row.get("highScore"),
-                    "totalScore": row.get("totalScore"),
-                    "lastLogin": row.get("lastLogin"),
-                    "logTime": log_time_8601,
-                }
+    def decode(self, b: bytes) -> list[dict[str, Any]]:
+        members = GuildMembers()
+        members.ParseFromString(b)
+        return list(self.to_rows(members))
 
-    def to_csv(self) -> None:
-        filename = (
-            f"gfl2logger_guildmembers_{self.log_time.strftime('%Y%m%dT%H%M%SZ')}.csv"
-        )
-        cols = [
-            "uid",
-            "name",
-            "level",
-            "weeklyMerit",
-            "totalMerit",
-            "highScore",
-            "totalScore",
-            "lastLogin",
-            "logTime",
-        ]
-        data = self.to_dicts()
+    def to_rows(self, members: GuildMembers) -> Generator[dict[str, Any]]:
+        log_time_8601 = self.log_time.strftime("%Y-%m-%dT%H:%M:%SZ")
 
-        try:
-            with open(filename, "w", encoding="utf-8", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
-                writer.writeheader()
-                writer.writerows(data)
-            logger.log(log.ALERT, f"Guild members data written to {filename}")
-        except OSError as e:
-            logger.error(f"Failed to write to {filename}, error={e}")
+        for (
+            uid,
+            name,
+            level,
+            weekly_merit,
+            total_merit,
+            high_score,
+            total_score,
+            last_login,
+        ) in map(self.ROW, members.members):
+            yield {
+                "uid": uid,
+                "name": name,
+                "level": level,
+                "weeklyMerit": weekly_merit,
+                "totalMerit": total_merit,
+                "highScore": high_score,
+                "totalScore": total_score,
+                "lastLogin": last_login,
+                "logTime": log_time_8601,
+            }
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from gfl2logger.gfl2 import metrics
+from gfl2logger.gfl2.data.base import BaseData
+from gfl2logger.gfl2.history import MemberHistory
+from gfl2logger.gfl2.sqlite_sink import SQLiteSink
+from gfl2logger.gfl2.trace import TraceLog
+from gfl2logger.utils import asyncio_utils
+
+logger = logging.getLogger(__name__)
+
+
+class Exporter:
+    """
+    Schedules exports on a dedicated worker pool.
+
+    Each data type has its own FIFO drained by one task at a time, so files of the
+    same type are written in order while different types are written concurrently.
+    A pending snapshot that has not started yet is replaced by a newer one of the
+    same type. Decoders submit without awaiting.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_pending: int = 32,
+        sink: SQLiteSink | None = None,
+        dedup: bool = True,
+        delta: bool = False,
+        format: str = "default",
+        compression: str = "none",
+        history: MemberHistory | None = None,
+        trace: TraceLog | None = None,
+    ):
+        self.pool = ThreadPoolExecutor(
+            max_workers=max(max_workers, 1), thread_name_prefix="GFL2Exporter"
+        )
+        self.max_pending = max(max_pending, 1)
+        # writes to files if None
+        self.sink = sink
+        # skip exports identical to the previous one of the same type
+        self.dedup = dedup
+        # write only rows changed since the previous export of the same type
+        self.delta = delta
+        # file format and compression, see writers
+        self.format = format
+        self.compression = compression
+        # Platoon member time series, updated alongside the export
+        self.history = history
+        # latency of each written export through the pipeline
+        self.trace = trace
+        # last exported content by data type, only touched by that type's drain task
+        self.digests: dict[str, bytes] = {}
+        self.snapshots: dict[str, dict[Any, dict[str, Any]]] = {}
+        self.unchanged = 0
+        self.pending: dict[str, deque[BaseData]] = {}
+        self.tasks: dict[str, asyncio.Task] = {}
+        self.closed = False
+        self.dropped = 0
+        self.coalesced = 0
+        # all seconds from first chunk arrival to submission, by data type
+        self.wait_seconds: defaultdict[str, metrics.Histogram] = defaultdict(
+            lambda: metrics.Histogram(metrics.SECONDS_BUCKETS)
+        )
+        # all seconds spent writing, by data type
+        self.write_seconds: defaultdict[str, metrics.Histogram] = defaultdict(
+            lambda: metrics.Histogram(metrics.SECONDS_BUCKETS)
+        )
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.pending.values())
+
+    def submit(self, data: BaseData) -> None:
+        name = data.__class__.__name__
+        if self.closed:
+            logger.warning(f"Export skipped after shutdown, type={name}")
+            return
+
+        data.submitted = time.monotonic()
+        wait = data.submitted - data.arrival
+        self.wait_seconds[name].observe(wait)
+        logger.debug(f"Export submitted, type={name}, wait={wait:.3f}s")
+
+        if not data.enabled() and not self.records_history(data):
+            return
+
+        queue = self.pending.setdefault(name, deque())
+
+        # newer snapshot supersedes the one that has not started yet
+        if queue and not queue[-1].part:
+            queue.pop()
+            self.coalesced += 1
+            logger.debug(f"Export superseded, type={name}")
+
+        queue.append(data)
+        if len(queue) > self.max_pending:
+            queue.popleft()
+            self.dropped += 1
+            logger.warning(
+                f"Export queue full, dropped={name}, total_dropped={self.dropped}"
+            )
+
+        if name not in self.tasks:
+            self.tasks[name] = asyncio_utils.create_task(self.drain(name))
+
+    async def drain(self, name: str) -> None:
+        queue = self.pending[name]
+        loop = asyncio.get_running_loop()
+        try:
+            while queue:
+                data = queue.popleft()
+                start = data.dispatched = time.monotonic()
+                try:
+                    await loop.run_in_executor(self.pool, self.write, data)
+                except Exception as e:
+                    logger.error(f"Unable to export data, exception={e}")
+                    continue
+
+                write_time = time.monotonic() - start
+                self.write_seconds[name].observe(write_time)
+                logger.debug(
+                    f"Export written, type={name}, write={write_time:.3f}s, depth={self.depth}"
+                )
+        finally:
+            del self.tasks[name]
+
+    def write(self, data: BaseData) -> None:
+        data.started = time.monotonic()
+        written = self.export(data)
+        data.written = time.monotonic()
+        if written and self.trace is not None:
+            self.trace.record(data)
+
+    def export(self, data: BaseData) -> bool:
+        """Writes data unless unchanged, returns whether it was written."""
+        name = data.NAME
+
+        # pieces of a message are not whole snapshots, written as they are
+        if data.part:
+            if not data.enabled():
+                return False
+            if self.sink is not None:
+                return self.sink.write(data)
+            return data.write(self.format, self.compression)
+
+        # submitted only for the member history, nothing is written
+        if not data.enabled():
+            if self.records_history(data):
+                self.history.record(data)
+            return False
+
+        digest = None
+        if self.dedup:
+            digest = data.digest()
+            if self.digests.get(name) == digest:
+                self.unchanged += 1
+                logger.info(f"{data.LABEL} data unchanged, export skipped")
+                return False
+
+        if self.records_history(data):
+            self.history.record(data)
+
+        # what was exported is only remembered once it is written, a failed
+        # export is retried by the next one even if unchanged
+        if self.sink is not None:
+            written = self.sink.write(data)
+        elif self.delta and "uid" in data.columns():
+            current = {row.get("uid"): row for row in data.to_dicts()}
+            previous = self.snapshots.get(name)
+            if previous is not None:
+                written = data.write_delta(
+                    previous, current, self.format, self.compression
+                )
+            else:
+                written = data.write(self.format, self.compression)
+            if written:
+                self.snapshots[name] = current
+        else:
+            written = data.write(self.format, self.compression)
+
+        if written and digest is not None:
+            self.digests[name] = digest
+        return written
+
+    def records_history(self, data: BaseData) -> bool:
+        return self.history is not None and data.NAME == self.history.name
+
+    async def stop(self, timeout: float) -> None:
+        """Stops accepting exports and waits up to timeout seconds for pending ones."""
+        self.closed = True
+        tasks = list(self.tasks.values())
+        if tasks:
+            _, not_done = await asyncio.wait(tasks, timeout=timeout)
+            if not_done:
+                logger.warning(
+                    f"Export deadline exceeded, abandoned={self.depth + len(not_done)}"
+                )
+                for task in not_done:
+                    task.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
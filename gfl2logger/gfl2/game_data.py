@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import json
+import logging
+import lzma
+import os
+from typing import Any
+
+from mitmproxy import log
+
+import embed
+
+logger = logging.getLogger(__name__)
+
+XZ_MAGIC = b"\xfd7zXZ\x00"
+
+
+def parse(raw: bytes) -> dict[str, Any]:
+    """
+    Reads a JSON object of game data tables by name, optionally xz compressed.
+    Unknown tables are ignored.
+
+    External files are never unpickled like embed/gfl2.xz, loading them must
+    not run code from whoever can write the path.
+    """
+    if raw.startswith(XZ_MAGIC):
+        raw = lzma.decompress(raw)
+
+    content = json.loads(raw)
+    if not isinstance(content, dict):
+        raise ValueError("not a JSON object of tables")
+
+    tables = {}
+    for name, table in content.items():
+        if name not in embed.TABLES:
+            continue
+        if not isinstance(table, dict):
+            raise ValueError(f"table {name} is not a mapping")
+        # JSON object keys are always strings, table keys are ids
+        tables[name] = {int(k): v for k, v in table.items()}
+    if not tables:
+        raise ValueError("no known tables")
+    return tables
+
+
+def load(path: str) -> tuple[bytes, dict[str, Any]]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return hashlib.blake2b(raw, digest_size=16).digest(), parse(raw)
+
+
+class GameDataWatcher:
+    """
+    Replaces the embedded game data with an external file and reloads it when
+    it changes. The file is read and parsed in a worker thread and the tables
+    are swapped in whole, lookups never see a partially built table.
+    """
+
+    def __init__(self, path: str, interval: float = 2.0):
+        self.path = path
+        self.interval = interval
+        # (mtime, size) of the last file read
+        self.stat: tuple[int, int] | None = None
+        self.digest: bytes | None = None
+        self.reloads = 0
+
+    async def run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    async def check(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except OSError as e:
+            if self.stat is not None:
+                logger.warning(f"Game data unavailable, path={self.path}, error={e}")
+                self.stat = None
+            return
+
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat == self.stat:
+            return
+        self.stat = stat
+
+        try:
+            digest, tables = await asyncio.to_thread(load, self.path)
+        except Exception as e:
+            logger.error(f"Failed to load game data, path={self.path}, error={e}")
+            return
+
+        # touched or rewritten with the same content
+        if digest == self.digest:
+            return
+        self.digest = digest
+
+        embed.update(tables)
+        self.reloads += 1
+        logger.log(
+            log.ALERT,
+            f"Game data loaded from {self.path}, tables={','.join(sorted(tables))}",
+        )
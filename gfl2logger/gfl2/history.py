@@ -0,0 +1,161 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from gfl2logger.gfl2.data.guild_members import GuildMembersData
+
+logger = logging.getLogger(__name__)
+
+# tracked values, a new row is stored when any of them changes
+FIELDS = [
+    "name",
+    "level",
+    "weeklyMerit",
+    "totalMerit",
+    "highScore",
+    "totalScore",
+    "lastLogin",
+]
+
+
+def schema(columns: dict[str, str]) -> str:
+    fields = ", ".join(f"{c} {columns[c]}" for c in FIELDS)
+    return f"""
+CREATE TABLE IF NOT EXISTS member_history (
+    uid INTEGER NOT NULL,
+    logTime TEXT NOT NULL,
+    {fields},
+    PRIMARY KEY (uid, logTime)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS member_history_logTime ON member_history (logTime);
+CREATE TABLE IF NOT EXISTS member_latest (
+    uid INTEGER PRIMARY KEY,
+    logTime TEXT NOT NULL,
+    {fields}
+);
+CREATE INDEX IF NOT EXISTS member_latest_lastLogin ON member_latest (lastLogin);
+"""
+
+
+class MemberHistory:
+    """
+    Append-only time series of Platoon members by uid.
+
+    A member's row is stored only when one of FIELDS differs from the latest
+    stored row of that member, so repeated exports of an unchanged Platoon
+    add nothing. member_latest holds the current row of every member of the
+    latest export, members who left are only kept in member_history.
+    """
+
+    def __init__(self, path: str):
+        # imported here, data modules are only loaded when needed
+        from gfl2logger.gfl2.data.guild_members import GuildMembersData
+
+        # name of the exports recorded
+        self.name = GuildMembersData.NAME
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(schema(GuildMembersData.COLUMNS))
+            # latest values by uid, compared against every new export
+            self.latest: dict[int, tuple[Any, ...]] = {
+                row[0]: tuple(row[1:])
+                for row in self.conn.execute(
+                    f"SELECT uid, {', '.join(FIELDS)} FROM member_latest"
+                )
+            }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def record(self, data: "GuildMembersData") -> int:
+        """Stores the members that changed since their latest row, returns how many."""
+        log_time = data.log_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+        changed = []
+        members = set()
+        for row in data.to_dicts():
+            uid = row.get("uid")
+            if uid is None:
+                continue
+            members.add(uid)
+            values = tuple(row.get(c) for c in FIELDS)
+            if self.latest.get(uid) != values:
+                changed.append((uid, log_time, *values))
+        # an export without members says nothing about who left
+        left = [(uid,) for uid in self.latest if uid not in members] if members else []
+
+        if not changed and not left:
+            return 0
+
+        placeholders = ", ".join("?" * (len(FIELDS) + 2))
+        columns = ", ".join(FIELDS)
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO member_history (uid, logTime, {columns}) VALUES ({placeholders})",
+                    changed,
+                )
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO member_latest (uid, logTime, {columns}) VALUES ({placeholders})",
+                    changed,
+                )
+                self.conn.executemany("DELETE FROM member_latest WHERE uid = ?", left)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write to {self.path}, error={e}")
+            return 0
+
+        for uid, _, *values in changed:
+            self.latest[uid] = tuple(values)
+        for (uid,) in left:
+            del self.latest[uid]
+        logger.info(
+            f"Platoon member history updated, changed={len(changed)}, left={len(left)}"
+        )
+        return len(changed)
+
+    def query(self, sql: str, params: tuple = ()) -> list[dict[str, Any]]:
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def history(self, uid: int) -> list[dict[str, Any]]:
+        """Stored rows of a member, oldest first."""
+        return self.query(
+            "SELECT * FROM member_history WHERE uid = ? ORDER BY logTime", (uid,)
+        )
+
+    def weekly_totals(self, since: datetime | None = None) -> list[dict[str, Any]]:
+        """
+        Highest weekly merit of each member in each week, with weeks in UTC
+        named by the date of their Monday, latest week first. Members who
+        left keep the name of their rows in that week.
+        """
+        since_8601 = since.strftime("%Y-%m-%dT%H:%M:%SZ") if since else ""
+        return self.query(
+            "SELECT date(h.logTime, 'weekday 0', '-6 days') AS week, h.uid, "
+            "COALESCE(l.name, MAX(h.name)) AS name, "
+            "MAX(COALESCE(h.weeklyMerit, 0)) AS weeklyMerit, "
+            "MAX(COALESCE(h.totalScore, 0)) AS totalScore "
+            "FROM member_history h LEFT JOIN member_latest l ON l.uid = h.uid "
+            "WHERE h.logTime >= ? "
+            "GROUP BY week, h.uid ORDER BY week DESC, weeklyMerit DESC",
+            (since_8601,),
+        )
+
+    def inactive(
+        self, days: float = 7, now: float | None = None
+    ) -> list[dict[str, Any]]:
+        """Current members whose last login is older than days, longest inactive first."""
+        cutoff = (time.time() if now is None else now) - days * 86400
+        return self.query(
+            "SELECT * FROM member_latest WHERE lastLogin < ? OR lastLogin IS NULL "
+            "ORDER BY lastLogin",
+            (cutoff,),
+        )
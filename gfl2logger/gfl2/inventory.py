@@ -0,0 +1,35 @@
+from collections.abc import Iterable
+from typing import Any
+
+
+class Inventory:
+    """
+    Rows of owned items by uid from their latest snapshot, updated as their
+    chunks are decoded, so other data can refer to them without reading
+    exported files. The first chunk of a snapshot starts a new index, items
+    gone since the previous one, or owned by another account after a relog,
+    are dropped.
+
+    Only the decoder thread writes to the indexes. Readers on other threads
+    see either the previous or the new row of an item.
+    """
+
+    def __init__(self):
+        self.weapons: dict[str, dict[str, Any]] = {}
+        self.attachments: dict[str, dict[str, Any]] = {}
+        self.common_keys: dict[str, dict[str, Any]] = {}
+
+    def update(
+        self, name: str, rows: Iterable[dict[str, Any]], new: bool = False
+    ) -> None:
+        """Adds rows to the index name, new replaces it once they are added."""
+        index = {} if new else getattr(self, name)
+        for row in rows:
+            uid = row.get("uid")
+            if uid is not None:
+                index[uid] = row
+        if new:
+            setattr(self, name, index)
+
+
+INVENTORY = Inventory()
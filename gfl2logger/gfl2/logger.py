@@ -1,10 +1,24 @@
+import asyncio
+import importlib.util
 import logging
+import os
+import sqlite3
+from collections import Counter
+from collections.abc import Sequence
 
-from mitmproxy import addonmanager, flow, log, tcp
+from mitmproxy import addonmanager, ctx, exceptions, flow, log, tcp
 
-from gfl2logger.gfl2 import data
+import embed
+from gfl2logger.gfl2 import classifier, data, metrics, writers
+from gfl2logger.gfl2.capture import CaptureWriter
+from gfl2logger.gfl2.exporter import Exporter
+from gfl2logger.gfl2.game_data import GameDataWatcher
+from gfl2logger.gfl2.history import MemberHistory
+from gfl2logger.gfl2.metrics_server import MetricsServer
 from gfl2logger.gfl2.parser import GFL2Parser
-from gfl2logger.utils import version
+from gfl2logger.gfl2.sqlite_sink import SQLiteSink
+from gfl2logger.gfl2.trace import TraceLog, format_summary
+from gfl2logger.utils import asyncio_utils, version
 
 logger = logging.getLogger(__name__)
 
@@ -12,34 +26,361 @@ logger = logging.getLogger(__name__)
 class GFL2Logger:
     def __init__(self) -> None:
         self.active_flows: dict[flow.Flow, GFL2Parser] = {}
+        # first server bytes of flows not yet classified
+        self.pending_flows: dict[flow.Flow, bytes] = {}
+        self.server_rules: list[classifier.ServerRule] = []
+        self.flow_history = -1
+        self.aggregate_idle = 0.0
+        self.aggregate_max_bytes = 0
+        self.exporter: Exporter | None = None
+        self.sink: SQLiteSink | None = None
+        self.history: MemberHistory | None = None
+        self.trace: TraceLog | None = None
+        self.game_data_task: asyncio.Task | None = None
+        self.capture: CaptureWriter | None = None
+        # capture ids of game flows being recorded
+        self.captures: dict[flow.Flow, int] = {}
+        # bytes of unrecognized payloads skipped by ended flows, by payload type
+        self.skipped_bytes: Counter[int] = Counter()
+        # payloads of ended flows, by payload type
+        self.payloads: Counter[int] = Counter()
+        self.skipped_payloads: Counter[int] = Counter()
+        # sizes of ended flows
+        self.flow_bytes = metrics.Histogram(metrics.BYTES_BUCKETS)
+        self.flow_frames = metrics.Histogram(metrics.FRAMES_BUCKETS)
+        self.metrics_server: MetricsServer | None = None
 
     def load(self, loader: addonmanager.Loader) -> None:
         data.add_options(loader)
+        loader.add_option(
+            name="gfl2_export_queue_size",
+            typespec=int,
+            default=32,
+            help="Maximum number of pending exports per data type, the oldest is dropped when full",
+        )
+        loader.add_option(
+            name="gfl2_export_workers",
+            typespec=int,
+            default=2,
+            help="Number of threads writing exports",
+        )
+        loader.add_option(
+            name="gfl2_export_timeout",
+            typespec=float,
+            default=10.0,
+            help="Seconds to wait for pending exports on shutdown",
+        )
+        loader.add_option(
+            name="gfl2_game_servers",
+            typespec=Sequence[str],
+            default=[],
+            help='Only parse flows to these servers ("ip", ":port", "ip:port" or "[ipv6]:port"), all flows are sniffed if empty',
+        )
+
+        loader.add_option(
+            name="gfl2_flow_history",
+            typespec=int,
+            default=16,
+            help="Number of already parsed TCP messages kept per flow for diagnostics, -1 keeps all",
+        )
+
+        loader.add_option(
+            name="gfl2_aggregate_idle",
+            typespec=float,
+            default=5.0,
+            help="Seconds without new chunks before aggregated data is exported, 0 waits for the next payload type",
+        )
+        loader.add_option(
+            name="gfl2_aggregate_max_bytes",
+            typespec=int,
+            default=64 * 1024 * 1024,
+            help="Export aggregated data early once it exceeds this many bytes, 0 for no limit",
+        )
+
+        loader.add_option(
+            name="gfl2_sqlite",
+            typespec=str,
+            default="",
+            help="Write data to this SQLite database instead of CSV/JSON files, empty to disable",
+        )
+        loader.add_option(
+            name="gfl2_member_history",
+            typespec=str,
+            default="",
+            help="Keep a history of Platoon member changes in this SQLite database, empty to disable",
+        )
+
+        loader.add_option(
+            name="gfl2_dedup",
+            typespec=bool,
+            default=True,
+            help="Skip exports identical to the previous one of the same type",
+        )
+        loader.add_option(
+            name="gfl2_delta",
+            typespec=bool,
+            default=False,
+            help="After the first export of a type, write only rows added, removed or changed by uid",
+        )
+        loader.add_option(
+            name="gfl2_output_format",
+            typespec=str,
+            default="default",
+            choices=writers.FORMATS,
+            help="Format of exported files, default writes CSV or JSON depending on the data type",
+        )
+        loader.add_option(
+            name="gfl2_compression",
+            typespec=str,
+            default="none",
+            choices=list(writers.COMPRESSIONS),
+            help="Compress exported files as they are written",
+        )
+
+        loader.add_option(
+            name="gfl2_capture",
+            typespec=str,
+            default="",
+            help="Record the server byte stream of game flows to capture files in this directory, empty to disable",
+        )
+
+        loader.add_option(
+            name="gfl2_trace",
+            typespec=str,
+            default="",
+            help="Append the latency of each export through the pipeline to this file, empty to disable",
+        )
+        loader.add_option(
+            name="gfl2_metrics_port",
+            typespec=int,
+            default=0,
+            help="Serve pipeline metrics at http://127.0.0.1:<port>/metrics, 0 to disable",
+        )
+
+        loader.add_option(
+            name="gfl2_game_data",
+            typespec=str,
+            default="",
+            help="Use game data tables from this JSON file (optionally .xz) instead of the embedded ones, reloaded when it changes",
+        )
+
+    def configure(self, updated: set[str]) -> None:
+        if "gfl2_metrics_port" in updated:
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+                self.metrics_server = None
+            if ctx.options.gfl2_metrics_port:
+                try:
+                    self.metrics_server = MetricsServer.bind(
+                        self, ctx.options.gfl2_metrics_port
+                    )
+                except OSError as e:
+                    raise exceptions.OptionsError(
+                        f"Unable to serve metrics on port {ctx.options.gfl2_metrics_port}, error={e}"
+                    )
+                asyncio_utils.create_task(self.metrics_server.start())
+        if "gfl2_sqlite" in updated:
+            if self.sink is not None:
+                self.sink.close()
+                self.sink = None
+            if ctx.options.gfl2_sqlite:
+                try:
+                    self.sink = SQLiteSink(ctx.options.gfl2_sqlite)
+                except sqlite3.Error as e:
+                    raise exceptions.OptionsError(
+                        f"Unable to open {ctx.options.gfl2_sqlite}, error={e}"
+                    )
+            if self.exporter is not None:
+                self.exporter.sink = self.sink
+        if "gfl2_member_history" in updated:
+            if self.history is not None:
+                self.history.close()
+                self.history = None
+            if ctx.options.gfl2_member_history:
+                try:
+                    self.history = MemberHistory(ctx.options.gfl2_member_history)
+                except sqlite3.Error as e:
+                    raise exceptions.OptionsError(
+                        f"Unable to open {ctx.options.gfl2_member_history}, error={e}"
+                    )
+            if self.exporter is not None:
+                self.exporter.history = self.history
+        if "gfl2_trace" in updated:
+            if self.trace is not None:
+                self.trace.close()
+                self.trace = None
+            if ctx.options.gfl2_trace:
+                try:
+                    self.trace = TraceLog(ctx.options.gfl2_trace)
+                except OSError as e:
+                    raise exceptions.OptionsError(
+                        f"Unable to open {ctx.options.gfl2_trace}, error={e}"
+                    )
+            if self.exporter is not None:
+                self.exporter.trace = self.trace
+        if "gfl2_capture" in updated:
+            if self.capture is not None:
+                self.capture.stop()
+                self.capture = None
+                self.captures.clear()
+            if ctx.options.gfl2_capture:
+                try:
+                    os.makedirs(ctx.options.gfl2_capture, exist_ok=True)
+                except OSError as e:
+                    raise exceptions.OptionsError(
+                        f"Unable to create {ctx.options.gfl2_capture}, error={e}"
+                    )
+                self.capture = CaptureWriter(ctx.options.gfl2_capture)
+        if "gfl2_game_data" in updated:
+            if self.game_data_task is not None:
+                self.game_data_task.cancel()
+                self.game_data_task = None
+                embed.reset()
+            if ctx.options.gfl2_game_data:
+                if not os.path.isfile(ctx.options.gfl2_game_data):
+                    raise exceptions.OptionsError(
+                        f"Game data file {ctx.options.gfl2_game_data} does not exist"
+                    )
+                watcher = GameDataWatcher(ctx.options.gfl2_game_data)
+                self.game_data_task = asyncio_utils.create_task(watcher.run())
+        if "gfl2_output_format" in updated:
+            if ctx.options.gfl2_output_format not in writers.FORMATS:
+                raise exceptions.OptionsError(
+                    f"Invalid output format {ctx.options.gfl2_output_format}"
+                )
+        if "gfl2_compression" in updated:
+            if ctx.options.gfl2_compression not in writers.COMPRESSIONS:
+                raise exceptions.OptionsError(
+                    f"Invalid compression {ctx.options.gfl2_compression}"
+                )
+            # checked here, exports would only fail later on a worker thread
+            module = writers.COMPRESSION_MODULES.get(ctx.options.gfl2_compression)
+            if module is not None and importlib.util.find_spec(module) is None:
+                raise exceptions.OptionsError(
+                    f"Compression {ctx.options.gfl2_compression} requires the {module} package"
+                )
+        if self.exporter is not None:
+            if "gfl2_dedup" in updated:
+                self.exporter.dedup = ctx.options.gfl2_dedup
+            if "gfl2_delta" in updated:
+                self.exporter.delta = ctx.options.gfl2_delta
+            if "gfl2_output_format" in updated:
+                self.exporter.format = ctx.options.gfl2_output_format
+            if "gfl2_compression" in updated:
+                self.exporter.compression = ctx.options.gfl2_compression
+        if "gfl2_aggregate_idle" in updated:
+            self.aggregate_idle = ctx.options.gfl2_aggregate_idle
+        if "gfl2_aggregate_max_bytes" in updated:
+            self.aggregate_max_bytes = ctx.options.gfl2_aggregate_max_bytes
+        if "gfl2_flow_history" in updated:
+            self.flow_history = ctx.options.gfl2_flow_history
+        if "gfl2_game_servers" in updated:
+            self.server_rules = classifier.parse_server_rules(
+                ctx.options.gfl2_game_servers
+            )
 
     async def running(self) -> None:
+        self.exporter = Exporter(
+            ctx.options.gfl2_export_workers,
+            ctx.options.gfl2_export_queue_size,
+            self.sink,
+            ctx.options.gfl2_dedup,
+            ctx.options.gfl2_delta,
+            ctx.options.gfl2_output_format,
+            ctx.options.gfl2_compression,
+            self.history,
+            self.trace,
+        )
         logger.log(
             log.ALERT, f"{self.__class__.__name__} v{version.get_version()} is running"
         )
 
     async def tcp_start(self, flow: tcp.TCPFlow) -> None:
-        self.active_flows[flow] = GFL2Parser()
+        if self.exporter is None:
+            logger.warning("Flow started before exporter is running")
+            return
+        if self.server_rules and not classifier.match_server(
+            self.server_rules, flow.server_conn.address
+        ):
+            flow.metadata["gfl2logger"] = "passthrough"
+            return
+        self.pending_flows[flow] = b""
 
     async def tcp_message(self, flow: tcp.TCPFlow) -> None:
+        message = flow.messages[-1]
+        self.trim_messages(flow)
+
+        # TODO: parse client/server messages separately; currently we just ignore client
+        if message.from_client:
+            return
+
         parser = self.active_flows.get(flow)
-        if parser is None:
-            logger.warning("Message not in active flow")
+        if parser is not None:
+            self.record(flow, message.content, message.timestamp)
+            parser.on_message(message.content)
             return
 
-        message = flow.messages[-1]
+        head = self.pending_flows.get(flow)
+        if head is None:
+            return
 
-        # TODO: parse client/server messages separately; currently we just ignore client
-        if not message.from_client:
-            await parser.on_message(message.content)
+        content = head + message.content if head else message.content
+        match classifier.sniff(content):
+            case None if len(content) > classifier.SNIFF_MAX:
+                del self.pending_flows[flow]
+                flow.metadata["gfl2logger"] = "passthrough"
+                logger.debug(
+                    f"Unclassified flow, address={flow.server_conn.address}, len={len(content)}"
+                )
+            case None:
+                self.pending_flows[flow] = content
+            case True:
+                del self.pending_flows[flow]
+                flow.metadata["gfl2logger"] = "game"
+                parser = GFL2Parser(
+                    self.exporter, self.aggregate_idle, self.aggregate_max_bytes
+                )
+                self.active_flows[flow] = parser
+                if self.capture is not None:
+                    self.captures[flow] = self.capture.open(flow.server_conn.address)
+                self.record(flow, content, message.timestamp)
+                parser.on_message(content)
+            case False:
+                del self.pending_flows[flow]
+                flow.metadata["gfl2logger"] = "passthrough"
+                logger.debug(f"Passthrough flow, address={flow.server_conn.address}")
+
+    def record(self, flow: tcp.TCPFlow, content: bytes, timestamp: float) -> None:
+        capture_id = self.captures.get(flow)
+        if capture_id is not None and self.capture is not None:
+            self.capture.record(capture_id, content, timestamp)
+
+    def trim_messages(self, flow: tcp.TCPFlow) -> None:
+        """
+        Releases messages that have been consumed, keeping the last flow_history.
+        Trimming is amortized by letting the window grow to twice its size first.
+        """
+        keep = self.flow_history
+        if keep < 0 or len(flow.messages) <= 2 * keep:
+            return
+        del flow.messages[: len(flow.messages) - keep]
 
     async def tcp_end(self, flow: tcp.TCPFlow) -> None:
-        if flow in self.active_flows:
-            self.active_flows[flow].stop()
-        self.active_flows.pop(flow, None)
+        self.pending_flows.pop(flow, None)
+        capture_id = self.captures.pop(flow, None)
+        if capture_id is not None and self.capture is not None:
+            self.capture.close(capture_id)
+        parser = self.active_flows.pop(flow, None)
+        if parser is not None:
+            parser.stop()
+            self.skipped_bytes.update(parser.skipped_bytes)
+            self.skipped_payloads.update(parser.skipped_payloads)
+            self.payloads.update(parser.payloads)
+            self.flow_bytes.observe(parser.bytes)
+            self.flow_frames.observe(parser.frames)
+            logger.debug(
+                f"Flow ended, skipped_bytes={dict(parser.skipped_bytes.most_common(10))}"
+            )
 
     async def tcp_error(self, flow: tcp.TCPFlow) -> None:
         await self.tcp_end(flow)
@@ -48,3 +389,27 @@ class GFL2Logger:
         for parser in self.active_flows.values():
             parser.stop()
         self.active_flows.clear()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        self.pending_flows.clear()
+        if self.game_data_task is not None:
+            self.game_data_task.cancel()
+            self.game_data_task = None
+        if self.capture is not None:
+            self.capture.stop(ctx.options.gfl2_export_timeout)
+            self.capture = None
+            self.captures.clear()
+        if self.exporter is not None:
+            await self.exporter.stop(ctx.options.gfl2_export_timeout)
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+        if self.history is not None:
+            self.history.close()
+            self.history = None
+        if self.trace is not None:
+            for line in format_summary(self.trace.summary()):
+                logger.info(line)
+            self.trace.close()
+            self.trace = None
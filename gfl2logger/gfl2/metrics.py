@@ -0,0 +1,34 @@
+import bisect
+from collections import Counter, defaultdict
+from collections.abc import Sequence
+
+# Metrics are plain counters kept by the objects doing the work, they are only
+# gathered and formatted when scraped, see metrics_server.
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+FRAMES_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # observations per bucket, the last one is above every bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+
+# seconds spent decoding chunks on the decoder thread, by data type
+DECODE_SECONDS: defaultdict[str, Histogram] = defaultdict(
+    lambda: Histogram(SECONDS_BUCKETS)
+)
+# chunks handed to the decoder thread, by data type
+DECODES_SUBMITTED: Counter[str] = Counter()
@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import socket
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any
+
+from gfl2logger.gfl2.metrics import DECODE_SECONDS, DECODES_SUBMITTED, Histogram
+from gfl2logger.gfl2.parser import Payload
+from gfl2logger.gfl2.trace import QUANTILES
+
+if TYPE_CHECKING:
+    from gfl2logger.gfl2.logger import GFL2Logger
+
+logger = logging.getLogger(__name__)
+
+# name, type, help, samples of (suffix, labels, value)
+Family = tuple[str, str, str, list[tuple[str, dict[str, Any], float]]]
+
+
+def histogram_samples(
+    histograms: Iterable[tuple[dict[str, Any], Histogram]],
+) -> list[tuple[str, dict[str, Any], float]]:
+    samples: list[tuple[str, dict[str, Any], float]] = []
+    for labels, h in histograms:
+        cumulative = 0
+        for bound, count in zip(h.buckets, h.counts):
+            cumulative += count
+            samples.append(
+                ("_bucket", {**labels, "le": format_value(bound)}, cumulative)
+            )
+        cumulative += h.counts[-1]
+        samples.append(("_bucket", {**labels, "le": "+Inf"}, cumulative))
+        samples.append(("_sum", labels, h.sum))
+        samples.append(("_count", labels, cumulative))
+    return samples
+
+
+def collect(addon: "GFL2Logger") -> list[Family]:
+    parsers = list(addon.active_flows.values())
+    payloads = addon.payloads.copy()
+    skipped_payloads = addon.skipped_payloads.copy()
+    skipped_bytes = addon.skipped_bytes.copy()
+    flow_bytes = addon.flow_bytes.sum
+    flow_frames = addon.flow_frames.sum
+    for parser in parsers:
+        payloads.update(parser.payloads)
+        skipped_payloads.update(parser.skipped_payloads)
+        skipped_bytes.update(parser.skipped_bytes)
+        flow_bytes += parser.bytes
+        flow_frames += parser.frames
+
+    families: list[Family] = [
+        (
+            "gfl2_flows_active",
+            "gauge",
+            "Game flows being parsed",
+            [("", {}, len(parsers))],
+        ),
+        (
+            "gfl2_flows_pending",
+            "gauge",
+            "Flows not classified yet",
+            [("", {}, len(addon.pending_flows))],
+        ),
+        (
+            "gfl2_bytes_total",
+            "counter",
+            "Server bytes of game flows",
+            [("", {}, flow_bytes)],
+        ),
+        (
+            "gfl2_frames_total",
+            "counter",
+            "Frames of game flows",
+            [("", {}, flow_frames)],
+        ),
+        (
+            "gfl2_flow_bytes",
+            "histogram",
+            "Server bytes per ended game flow",
+            histogram_samples([({}, addon.flow_bytes)]),
+        ),
+        (
+            "gfl2_flow_frames",
+            "histogram",
+            "Frames per ended game flow",
+            histogram_samples([({}, addon.flow_frames)]),
+        ),
+        (
+            "gfl2_payloads_total",
+            "counter",
+            "Payloads by type id",
+            [("", {"type": t, "recognized": "true"}, n) for t, n in payloads.items()]
+            + [
+                ("", {"type": t, "recognized": "false"}, n)
+                for t, n in skipped_payloads.items()
+            ],
+        ),
+        (
+            "gfl2_skipped_bytes_total",
+            "counter",
+            "Bytes of unrecognized payloads by type id",
+            [("", {"type": t}, n) for t, n in skipped_bytes.items()],
+        ),
+        (
+            "gfl2_malformed_payloads_total",
+            "counter",
+            "Payloads that could not be parsed",
+            [("", {}, Payload.malformed)],
+        ),
+        (
+            "gfl2_decode_queue_depth",
+            "gauge",
+            "Chunks waiting for the decoder thread",
+            [
+                (
+                    "",
+                    {},
+                    DECODES_SUBMITTED.total()
+                    - sum(h.count for h in list(DECODE_SECONDS.values())),
+                )
+            ],
+        ),
+        (
+            "gfl2_decode_seconds",
+            "histogram",
+            "Time spent decoding a chunk, by data type",
+            histogram_samples(
+                ({"type": name}, h) for name, h in list(DECODE_SECONDS.items())
+            ),
+        ),
+    ]
+
+    exporter = addon.exporter
+    if exporter is not None:
+        families += [
+            (
+                "gfl2_export_queue_depth",
+                "gauge",
+                "Exports waiting to be written, by data type",
+                [
+                    ("", {"type": name}, len(queue))
+                    for name, queue in list(exporter.pending.items())
+                ],
+            ),
+            (
+                "gfl2_exports_dropped_total",
+                "counter",
+                "Exports dropped from a full queue",
+                [("", {}, exporter.dropped)],
+            ),
+            (
+                "gfl2_exports_coalesced_total",
+                "counter",
+                "Exports superseded by a newer one before being written",
+                [("", {}, exporter.coalesced)],
+            ),
+            (
+                "gfl2_exports_unchanged_total",
+                "counter",
+                "Exports skipped as identical to the previous one",
+                [("", {}, exporter.unchanged)],
+            ),
+            (
+                "gfl2_export_wait_seconds",
+                "histogram",
+                "Time from the first chunk of an export to its submission, by data type",
+                histogram_samples(
+                    ({"type": name}, h)
+                    for name, h in list(exporter.wait_seconds.items())
+                ),
+            ),
+            (
+                "gfl2_write_seconds",
+                "histogram",
+                "Time spent writing an export, by data type",
+                histogram_samples(
+                    ({"type": name}, h)
+                    for name, h in list(exporter.write_seconds.items())
+                ),
+            ),
+        ]
+
+    if addon.trace is not None:
+        families.append(
+            (
+                "gfl2_trace_milliseconds",
+                "summary",
+                "Recent latency of exports by data type and stage",
+                [
+                    ("", {"type": name, "stage": stage, "quantile": q}, value)
+                    for name, stages in addon.trace.summary().items()
+                    for stage, values in stages.items()
+                    for q, value in zip(QUANTILES, values)
+                ],
+            )
+        )
+
+    if addon.capture is not None:
+        families.append(
+            (
+                "gfl2_capture_bytes_written_total",
+                "counter",
+                "Bytes written to capture files",
+                [("", {}, addon.capture.bytes_written)],
+            )
+        )
+    return families
+
+
+def format_value(value: float) -> str:
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def render(families: list[Family]) -> str:
+    """Formats metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, type, help, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {type}")
+        for suffix, labels, value in samples:
+            if labels:
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{suffix}{{{label_str}}} {format_value(value)}")
+            else:
+                lines.append(f"{name}{suffix} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def summary(addon: "GFL2Logger") -> dict[str, int]:
+    """A few totals for the stats panel of the window."""
+    totals: dict[str, int] = {}
+    for name, _, _, samples in collect(addon):
+        if name.endswith(("_seconds", "_milliseconds", "_flow_bytes", "_flow_frames")):
+            continue
+        label = name.removeprefix("gfl2_").removesuffix("_total").replace("_", " ")
+        totals[label] = int(sum(value for _, _, value in samples))
+    return totals
+
+
+class MetricsServer:
+    """Serves the metrics of addon over HTTP on a local port."""
+
+    def __init__(self, addon: "GFL2Logger", sock: socket.socket):
+        self.addon = addon
+        self.sock = sock
+        self.server: asyncio.Server | None = None
+
+    @classmethod
+    def bind(cls, addon: "GFL2Logger", port: int) -> "MetricsServer":
+        sock = socket.create_server(("127.0.0.1", port))
+        return cls(addon, sock)
+
+    @property
+    def port(self) -> int:
+        return self.sock.getsockname()[1]
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle, sock=self.sock)
+        logger.info(f"Metrics served at http://127.0.0.1:{self.port}/metrics")
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        else:
+            self.sock.close()
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            method, path, *_ = request.split(b" ", 2)
+            if method != b"GET":
+                status, body = "405 Method Not Allowed", ""
+            elif path.split(b"?")[0] in (b"/", b"/metrics"):
+                status, body = "200 OK", render(collect(self.addon))
+            else:
+                status, body = "404 Not Found", ""
+            content = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(content)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + content
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        except (ConnectionError, TimeoutError):
+            pass
+        finally:
+            writer.close()
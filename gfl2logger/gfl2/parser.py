@@ -1,16 +1,25 @@
 import asyncio
 import logging
-from collections.abc import Generator
+import struct
+from collections import Counter
+from collections.abc import Container, Generator
 from typing import Self
 
 from gfl2logger.gfl2.data import DATA_TYPES
-from gfl2logger.utils import asyncio_utils
+from gfl2logger.gfl2.data.base import BaseData
+from gfl2logger.gfl2.exporter import Exporter
 
 logger = logging.getLogger(__name__)
 
+# type, length
+PAYLOAD_HEADER = struct.Struct("<HH")
+
 
 class Payload:
-    def __init__(self, b: bytearray, msg_id=-1):
+    # payloads that could not be parsed, across all flows
+    malformed = 0
+
+    def __init__(self, b: memoryview, msg_id=-1):
         if len(b) < 4:
             raise Exception(
                 f"cannot construct payload with less than 4 bytes, b={b.hex()}"
@@ -23,133 +32,283 @@ class Payload:
             raise Exception(
                 f"not enough data to construct payload, expected_len={self.len}, len(b)={len(b)}, b={b.hex()}"
             )
-        self.data = bytes(b[4 : self.len])
+        # view into the frame, not a copy
+        self.data = b[4 : self.len]
 
     @classmethod
-    def from_sequence(cls, b: bytearray, msg_id=-1) -> Generator[Self]:
+    def from_sequence(
+        cls,
+        b: bytes | memoryview,
+        msg_id=-1,
+        types: Container[int] | None = None,
+        skipped: Counter[int] | None = None,
+        skipped_payloads: Counter[int] | None = None,
+    ) -> Generator[Self | None]:
+        """
+        Yields payloads in b. If types is given, payloads of other types are skipped
+        from their header alone and None is yielded in their place so that callers
+        can still observe the interruption. Skipped bytes and payloads are counted
+        per type.
+        """
+        view = memoryview(b)
         i = 0
         try:
-            while i < len(b):
-                payload = cls(b[i:], msg_id)
+            while i < len(view):
+                if types is not None and len(view) - i >= 4:
+                    type, length = PAYLOAD_HEADER.unpack_from(view, i)
+                    if type not in types and i + 4 + length <= len(view):
+                        i += 4 + length
+                        if skipped is not None:
+                            skipped[type] += length
+                        if skipped_payloads is not None:
+                            skipped_payloads[type] += 1
+                        yield None
+                        continue
+
+                payload = cls(view[i:], msg_id)
                 i += payload.len
-                if i >= len(b):
+                if i >= len(view):
                     payload.end_of_msg = True
                 yield payload
         except Exception as e:
+            cls.malformed += 1
             logger.error(f"Malformed payload, exception={e}")
 
 
-class GFL2Parser:
+class FrameBuffer:
+    """
+    Reassembly buffer for frames split across or coalesced within TCP segments.
+
+    Consumed bytes are tracked with a read offset instead of being sliced off, and
+    the underlying bytearray is only compacted once the consumed prefix dominates it,
+    so each byte is copied a constant number of times regardless of burst size.
+    """
+
+    HEADER_LEN = 5
+    COMPACT_THRESHOLD = 64 * 1024
+
     def __init__(self):
-        self.msg_queue: asyncio.Queue[bytes] = asyncio.Queue()
-        self.payload_queue: asyncio.Queue[Payload] = asyncio.Queue()
-        self.active = True
+        self.buffer = bytearray()
+        self.offset = 0
+        self.total_len = 0
+        self.msg_id = -1
+
+    def __len__(self) -> int:
+        return len(self.buffer) - self.offset
+
+    def extend(self, content: bytes) -> None:
+        self.compact()
+        self.buffer.extend(content)
+
+    def clear(self) -> None:
+        self.buffer.clear()
+        self.offset = 0
+        self.total_len = 0
+        self.msg_id = -1
 
-        asyncio_utils.create_task(self.parse_message())
-        asyncio_utils.create_task(self.parse_payload())
+    def compact(self) -> None:
+        if self.offset == 0:
+            return
+        if self.offset == len(self.buffer):
+            self.buffer.clear()
+            self.offset = 0
+        elif self.offset >= self.COMPACT_THRESHOLD and self.offset * 2 >= len(
+            self.buffer
+        ):
+            del self.buffer[: self.offset]
+            self.offset = 0
+
+    def next_frame(self) -> tuple[int, memoryview] | None:
+        """
+        Returns (msg_id, body) of the next complete frame, or None if more data is needed.
+        The body is copied out of the buffer exactly once and payloads may keep views into it.
+        """
+        # start of new message
+        if self.total_len == 0:
+            if len(self) < self.HEADER_LEN:
+                return None
+            i = self.offset
+            self.msg_id = int.from_bytes(self.buffer[i : i + 3], "little")
+            self.total_len = (
+                int.from_bytes(self.buffer[i + 3 : i + 5], "little") + self.HEADER_LEN
+            )
+
+        # wait for more data
+        if self.total_len > len(self):
+            return None
+
+        start = self.offset + self.HEADER_LEN
+        end = self.offset + self.total_len
+        with memoryview(self.buffer) as view:
+            body = memoryview(view[start:end].tobytes())
+        msg_id = self.msg_id
+
+        self.offset = end
+        self.total_len = 0
+        self.msg_id = -1
+        return msg_id, body
+
+
+class GFL2Parser:
+    """
+    Incremental decoder for the server side of a flow.
+
+    Bytes are framed and decoded synchronously as they arrive, only completed
+    data is handed off to the exporter.
+    """
+
+    def __init__(
+        self, exporter: Exporter, idle_timeout: float = 0, max_pending_bytes: int = 0
+    ):
+        self.exporter = exporter
+        # flush data aggregated under msg_id 0 after this many idle seconds, 0 to disable
+        self.idle_timeout = idle_timeout
+        # flush data aggregated under msg_id 0 once it exceeds this size, 0 to disable
+        self.max_pending_bytes = max_pending_bytes
+        self.buffer = FrameBuffer()
+        self.prev_payload: Payload | None = None
+        self.prev_data: BaseData | None = None
+        self.idle_handle: asyncio.TimerHandle | None = None
+        # pieces flushed so far of the data of split_type over the size limit
+        self.parts = 0
+        self.split_type: int | None = None
+        self.skipped_bytes: Counter[int] = Counter()
+        self.skipped_payloads: Counter[int] = Counter()
+        # recognized payloads by type
+        self.payloads: Counter[int] = Counter()
+        self.bytes = 0
+        self.frames = 0
+        self.active = True
 
     def stop(self) -> None:
         self.active = False
-        self.msg_queue.shutdown()
-        self.payload_queue.shutdown()
+        self.buffer.clear()
+        # do not lose the last aggregated data of the flow
+        self.flush()
+
+    def on_message(self, content: bytes) -> None:
+        if not self.active:
+            return
 
-    async def on_message(self, content: bytes) -> None:
-        await self.msg_queue.put(content)
+        self.bytes += len(content)
+        buffer = self.buffer
+        buffer.extend(content)
 
-    async def parse_message(self) -> None:
-        buffer = bytearray()
-        total_len = 0
-        msg_id = -1
+        while True:
+            frame = buffer.next_frame()
 
-        while self.active:
-            try:
-                content = await self.msg_queue.get()
-            except asyncio.QueueShutDown:
+            # wait for more data, including the rest of a split frame header
+            if frame is None:
                 break
 
-            buffer.extend(content)
-
-            while True:
-                if total_len == 0 and len(buffer) < 5:
-                    logger.warning(
-                        f"Message skipped due to insufficient length, buffer={buffer.hex()}"
-                    )
-                    buffer.clear()
-                    break
-
-                # start of new messsage
-                if total_len == 0:
-                    msg_id = int.from_bytes(buffer[0:3], "little")
-                    total_len = int.from_bytes(buffer[3:5], "little") + 5
-
-                # wait for more data
-                if total_len > len(buffer):
-                    break
-
-                for payload in Payload.from_sequence(buffer[5:total_len], msg_id):
-                    await self.payload_queue.put(payload)
-
-                # end of mesage
-                if total_len == len(buffer):
-                    buffer.clear()
-                    total_len = 0
-                    msg_id = -1
-                    break
-
-                # jump to next message
-                buffer = buffer[total_len:]
-                total_len = 0
-                msg_id = -1
-
-    async def parse_payload(self) -> None:
-        prev_payload: Payload | None = None
-        prev_data = None
-        while self.active:
-            try:
-                payload = await self.payload_queue.get()
-            except asyncio.QueueShutDown:
+            msg_id, body = frame
+            self.frames += 1
+            for payload in Payload.from_sequence(
+                body, msg_id, DATA_TYPES, self.skipped_bytes, self.skipped_payloads
+            ):
+                if payload is None:
+                    self.flush()
+                else:
+                    self.parse_payload(payload)
+
+            # end of mesage
+            if len(buffer) == 0:
+                buffer.clear()
                 break
 
+    def flush(self, split: bool = False) -> None:
+        """split flushes a piece of the data, the rest follows as another piece."""
+        if self.idle_handle is not None:
+            self.idle_handle.cancel()
+            self.idle_handle = None
+        if self.prev_data is not None:
+            self.exporter.submit(self.prev_data)
+        if not split:
+            self.parts = 0
+        self.prev_payload = None
+        self.prev_data = None
+
+    def on_idle(self) -> None:
+        self.idle_handle = None
+        if self.prev_data is not None:
+            logger.debug(
+                f"Flushing idle data, type={self.prev_data.__class__.__name__}, size={self.prev_data.size}"
+            )
+        self.flush()
+
+    def check_pending(self) -> None:
+        """Bounds the memory and latency of data aggregated under msg_id 0."""
+        if self.prev_payload is None or self.prev_data is None:
+            return
+        if self.prev_payload.msg_id != 0:
+            return
+
+        if self.max_pending_bytes > 0 and self.prev_data.size > self.max_pending_bytes:
+            logger.warning(
+                f"Flushing aggregated data over size limit, type={self.prev_data.__class__.__name__}, size={self.prev_data.size}"
+            )
+            self.parts += 1
+            self.split_type = self.prev_payload.type
+            self.prev_data.part = self.parts
+            self.flush(split=True)
+            return
+
+        if self.idle_timeout > 0:
+            if self.idle_handle is not None:
+                self.idle_handle.cancel()
+            self.idle_handle = asyncio.get_running_loop().call_later(
+                self.idle_timeout, self.on_idle
+            )
+
+    def parse_payload(self, payload: Payload) -> None:
+        self.payloads[payload.type] += 1
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug(
                 f"PLD: msg_id={payload.msg_id}, eom={payload.end_of_msg}, type={payload.type}, len={payload.len}"
             )
 
-            # prev_payload exists
-            if prev_payload is not None and prev_data is not None:
-                # can append
-                if prev_payload.type == payload.type and (
-                    prev_payload.msg_id == 0 or prev_payload.msg_id == payload.msg_id
-                ):
-                    prev_payload = payload
-                    prev_data.append(payload.data)
-
-                    # end of message, export
-                    if payload.msg_id != 0 and payload.end_of_msg:
-                        await prev_data.export()
-                        prev_payload = None
-                        prev_data = None
-                    continue
-
-                # cannot append, export prev_data
-                await prev_data.export()
-                prev_payload = None
-                prev_data = None
-
-            # no prev_payload
-
-            # ignore unrecognized payload
-            if payload.type not in DATA_TYPES:
-                continue
-
-            data = DATA_TYPES[payload.type](payload.data)
-
-            # end of message, export
-            if payload.msg_id != 0 and payload.end_of_msg:
-                try:
-                    await data.export()
-                except Exception as e:
-                    logger.error(f"Unable to export data, exception={e}")
-                continue
-
-            prev_payload = payload
-            prev_data = data
+        prev_payload = self.prev_payload
+        prev_data = self.prev_data
+
+        # prev_payload exists
+        if prev_payload is not None and prev_data is not None:
+            # can append
+            if prev_payload.type == payload.type and (
+                prev_payload.msg_id == 0 or prev_payload.msg_id == payload.msg_id
+            ):
+                self.prev_payload = payload
+                prev_data.append(payload.data)
+
+                # end of message, export
+                if payload.msg_id != 0 and payload.end_of_msg:
+                    self.flush()
+                else:
+                    self.check_pending()
+                return
+
+            # cannot append, export prev_data
+            self.flush()
+
+        # no prev_payload
+
+        # unrecognized payloads are normally skipped in from_sequence
+        if payload.type not in DATA_TYPES:
+            return
+
+        # the rest of a message flushed in pieces is the next piece
+        part = 0
+        if self.parts:
+            if payload.type == self.split_type:
+                part = self.parts + 1
+            else:
+                self.parts = 0
+        data = DATA_TYPES[payload.type](payload.data, part)
+
+        # end of message, export
+        if payload.msg_id != 0 and payload.end_of_msg:
+            self.exporter.submit(data)
+            return
+
+        self.prev_payload = payload
+        self.prev_data = data
+        self.check_pending()
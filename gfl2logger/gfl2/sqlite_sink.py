@@ -0,0 +1,139 @@
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any
+
+from mitmproxy import log
+
+from gfl2logger.gfl2.data.base import BaseData
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    log_time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_type_log_time ON snapshots (type, log_time);
+"""
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def adapt(value: Any) -> Any:
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class SQLiteSink:
+    """
+    Writes each export as one snapshot in a single transaction.
+
+    Every data type has a table with its columns plus snapshot_id and row index,
+    indexed by uid where the data has one. The latest snapshot of a type is the
+    highest snapshots.id for that type.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # columns of each table created or migrated so far
+        self.tables: dict[str, set[str]] = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def ensure_table(self, name: str, columns: dict[str, str]) -> None:
+        if columns.keys() <= self.tables.get(name, set()):
+            return
+
+        table = quote(name)
+        self.create_table(name, columns)
+
+        types = {
+            row[1]: row[2] for row in self.conn.execute(f"PRAGMA table_info({table})")
+        }
+        # columns declared with another type by older versions, e.g. uint64
+        # uids as INTEGER, which stores values of 2^63 and up as REAL
+        retyped = [c for c, t in columns.items() if c in types and types[c] != t]
+        if retyped:
+            logger.info(f"Rebuilding table {name}, columns={','.join(retyped)}")
+            self.rebuild_table(name, {**types, **columns})
+            types = {**types, **columns}
+
+        # columns added to newer or reloaded game data
+        existing = set(types)
+        for c, t in columns.items():
+            if c not in existing:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {quote(c)} {t}")
+                existing.add(c)
+
+        if "uid" in columns:
+            self.conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {quote(name + '_uid')} ON {table} (uid, snapshot_id)"
+            )
+        self.conn.commit()
+        self.tables[name] = existing
+
+    def create_table(self, name: str, columns: dict[str, str]) -> None:
+        defs = "".join(f", {quote(c)} {t}" for c, t in columns.items())
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {quote(name)} ("
+            "snapshot_id INTEGER NOT NULL REFERENCES snapshots (id), "
+            f"idx INTEGER NOT NULL{defs}, "
+            "PRIMARY KEY (snapshot_id, idx))"
+        )
+
+    def rebuild_table(self, name: str, types: dict[str, str]) -> None:
+        """Copies a table into a new one with the given column types."""
+        table, old = quote(name), quote(name + "_old")
+        columns = {c: t for c, t in types.items() if c not in ("snapshot_id", "idx")}
+        names = ", ".join(quote(c) for c in ["snapshot_id", "idx", *columns])
+        self.conn.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        self.create_table(name, columns)
+        self.conn.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM {old}")
+        # drops the indexes of the old table, they are created again
+        self.conn.execute(f"DROP TABLE {old}")
+
+    def write(self, data: BaseData) -> bool:
+        """Writes data as a new snapshot, returns whether it was written."""
+        columns = data.columns()
+        rows = [
+            [i, *(adapt(row.get(c)) for c in columns)]
+            for i, row in enumerate(data.to_dicts())
+        ]
+        insert = (
+            f"INSERT INTO {quote(data.NAME)} (snapshot_id, idx, "
+            + ", ".join(quote(c) for c in columns)
+            + ") VALUES (?, ?"
+            + ", ?" * len(columns)
+            + ")"
+        )
+
+        try:
+            with self.lock:
+                self.ensure_table(data.NAME, columns)
+                with self.conn:
+                    snapshot_id = self.conn.execute(
+                        "INSERT INTO snapshots (type, log_time) VALUES (?, ?)",
+                        (data.NAME, data.log_time.strftime("%Y-%m-%dT%H:%M:%SZ")),
+                    ).lastrowid
+                    self.conn.executemany(insert, ([snapshot_id, *row] for row in rows))
+            logger.log(
+                log.ALERT,
+                f"{data.LABEL} data written to {self.path}, snapshot={snapshot_id}",
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write to {self.path}, error={e}")
+            return False
+        return True
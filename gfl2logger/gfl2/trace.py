@@ -0,0 +1,131 @@
+import argparse
+import json
+import logging
+import math
+import sys
+import threading
+from collections import defaultdict, deque
+from collections.abc import Iterable
+from typing import Any
+
+from gfl2logger.gfl2.data.base import BaseData
+
+logger = logging.getLogger(__name__)
+
+# stages of an export in milliseconds, in pipeline order
+#   receive:  first to last chunk arriving in tcp_message (framing, network)
+#   complete: last chunk to the parser completing the data (aggregation)
+#   pending:  completed to handed to the export pool (export queue)
+#   pool:     handed to the pool to a worker starting it (executor slot)
+#   decode:   protobuf decoding of its chunks on the decoder thread
+#   write:    worker starting to the file or database written (incl. decode wait)
+#   total:    first chunk to written
+STAGES = ("receive", "complete", "pending", "pool", "decode", "write", "total")
+QUANTILES = (0.5, 0.99)
+
+
+def stages(data: BaseData) -> dict[str, float]:
+    return {
+        "receive": data.last_arrival - data.arrival,
+        "complete": data.submitted - data.last_arrival,
+        "pending": data.dispatched - data.submitted,
+        "pool": data.started - data.dispatched,
+        "decode": data.decode_time,
+        "write": data.written - data.started,
+        "total": data.written - data.arrival,
+    }
+
+
+def quantile(values: list[float], q: float) -> float:
+    """Nearest-rank quantile of sorted values."""
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+def summarize(
+    traces: Iterable[dict[str, Any]],
+) -> dict[str, dict[str, tuple[float, ...]]]:
+    """Quantiles of each stage in milliseconds, by data type."""
+    by_type: defaultdict[str, defaultdict[str, list[float]]] = defaultdict(
+        lambda: defaultdict(list)
+    )
+    for t in traces:
+        for stage in STAGES:
+            by_type[t["type"]][stage].append(t[stage])
+
+    summary = {}
+    for name, values in by_type.items():
+        summary[name] = {}
+        for stage in STAGES:
+            v = sorted(values[stage])
+            summary[name][stage] = tuple(quantile(v, q) for q in QUANTILES)
+    return summary
+
+
+def format_summary(summary: dict[str, dict[str, tuple[float, ...]]]) -> list[str]:
+    return [
+        f"{name} p50/p99 ms: "
+        + ", ".join(f"{stage}={p50:.1f}/{p99:.1f}" for stage, (p50, p99) in s.items())
+        for name, s in summary.items()
+    ]
+
+
+class TraceLog:
+    """
+    Appends one JSON line per written export with the time it spent in each
+    stage, and keeps the recent ones of each data type for summaries.
+    """
+
+    def __init__(self, path: str, keep: int = 1000):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+        self.recent: defaultdict[str, deque[dict[str, Any]]] = defaultdict(
+            lambda: deque(maxlen=keep)
+        )
+
+    def record(self, data: BaseData) -> None:
+        name = data.__class__.__name__
+        trace: dict[str, Any] = {
+            "type": name,
+            "time": data.log_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "chunks": len(data.data),
+            "bytes": data.size,
+        }
+        for stage, seconds in stages(data).items():
+            trace[stage] = round(seconds * 1000, 3)
+        line = json.dumps(trace, separators=(",", ":"))
+
+        with self.lock:
+            self.recent[name].append(trace)
+            try:
+                self.file.write(line + "\n")
+                self.file.flush()
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to write to {self.path}, error={e}")
+
+    def summary(self) -> dict[str, dict[str, tuple[float, ...]]]:
+        with self.lock:
+            traces = [t for recent in self.recent.values() for t in recent]
+        return summarize(traces)
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Summarize a trace log as p50/p99 per data type"
+    )
+    parser.add_argument("path", help="trace log written with gfl2_trace")
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        traces = [json.loads(line) for line in f if line.strip()]
+    for line in format_summary(summarize(traces)):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import csv
+import gzip
+import json
+import lzma
+from collections.abc import Iterable
+from typing import Any, TextIO
+
+FORMATS = ["default", "ndjson"]
+
+COMPRESSIONS = {
+    "none": "",
+    "gzip": ".gz",
+    "xz": ".xz",
+    "zstd": ".zst",
+}
+# compressions needing a package outside the standard library, imported on use
+COMPRESSION_MODULES = {
+    "zstd": "zstandard",
+}
+
+
+def open_text(filename: str, compression: str = "none") -> TextIO:
+    """Opens filename for writing text, compressing it as it is written."""
+    match compression:
+        case "none":
+            return open(filename, "w", encoding="utf-8", newline="")
+        case "gzip":
+            return gzip.open(filename, "wt", encoding="utf-8", newline="")
+        case "xz":
+            return lzma.open(filename, "wt", encoding="utf-8", newline="")
+        case "zstd":
+            import zstandard
+
+            return zstandard.open(filename, "wt", encoding="utf-8", newline="")
+        case _:
+            raise ValueError(f"unknown compression {compression}")
+
+
+def write_csv(f: TextIO, rows: Iterable[dict[str, Any]], cols: list[str]) -> None:
+    writer = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def write_json(f: TextIO, rows: Iterable[dict[str, Any]], cols: list[str]) -> None:
+    """Writes a JSON array one row at a time, formatted like json.dump(indent=2)."""
+    sep = "[\n"
+    for row in rows:
+        f.write(sep)
+        f.write(
+            "  " + json.dumps(row, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        )
+        sep = ",\n"
+    f.write("[]" if sep == "[\n" else "\n]")
+
+
+def write_ndjson(f: TextIO, rows: Iterable[dict[str, Any]], cols: list[str]) -> None:
+    """Writes one compact JSON object per line, leaving out empty columns."""
+    keep = set(cols)
+    for row in rows:
+        f.write(
+            json.dumps(
+                {k: v for k, v in row.items() if k in keep and v is not None},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        )
+        f.write("\n")
+
+
+WRITERS = {
+    "csv": write_csv,
+    "json": write_json,
+    "ndjson": write_ndjson,
+}
+
+
+def write(
+    filename: str,
+    rows: Iterable[dict[str, Any]],
+    cols: list[str],
+    format: str,
+    compression: str = "none",
+) -> str:
+    """Streams rows to filename.format[.compression] and returns the final filename."""
+    filename = f"{filename}.{format}{COMPRESSIONS[compression]}"
+    with open_text(filename, compression) as f:
+        WRITERS[format](f, rows, cols)
+    return filename
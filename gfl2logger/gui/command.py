@@ -1,15 +1,42 @@
+import json
+import struct
+from collections.abc import Generator
 from enum import Enum, auto
 from typing import Any
 
+# command type, length of the JSON content
+HEADER = struct.Struct("<BI")
+
 
 class CommandType(Enum):
     LOG = auto()
     OPTIONS = auto()
     SAVE_OPTIONS = auto()
     SHUTDOWN = auto()
+    STATS = auto()
 
 
 class Command:
     def __init__(self, type: CommandType, content: Any):
         self.type = type
         self.content = content
+
+    def encode(self) -> bytes:
+        content = json.dumps(self.content, separators=(",", ":")).encode()
+        return HEADER.pack(self.type.value, len(content)) + content
+
+    @classmethod
+    def decode(cls, type: int, content: bytes) -> "Command":
+        return cls(CommandType(type), json.loads(content))
+
+    @classmethod
+    def decode_all(cls, buffer: bytearray) -> Generator["Command"]:
+        """Yields the complete commands in buffer and removes them from it."""
+        while len(buffer) >= HEADER.size:
+            type, length = HEADER.unpack_from(buffer)
+            end = HEADER.size + length
+            if len(buffer) < end:
+                return
+            content = bytes(buffer[HEADER.size : end])
+            del buffer[:end]
+            yield cls.decode(type, content)
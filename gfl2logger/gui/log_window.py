@@ -1,3 +1,4 @@
+from collections.abc import Sequence
 from tkinter.scrolledtext import ScrolledText
 
 
@@ -8,12 +9,18 @@ class LogWindow(ScrolledText):
         self.configure(state="disabled")
 
     def write(self, msg) -> None:
-        lines = int(self.index("end - 1 line").split(".")[0])
+        self.write_lines([msg])
+
+    def write_lines(self, msgs: Sequence[str]) -> None:
+        """Appends messages in a single update, keeping the last maxlines lines."""
+        if not msgs:
+            return
         self.configure(state="normal")
-        if lines > self.maxlines:
-            self.delete(1.0, 2.0)
         if self.index("end-1c") != "1.0":
             self.insert("end", "\n")
-        self.insert("end", msg)
+        self.insert("end", "\n".join(msgs))
+        excess = int(self.index("end - 1 line").split(".")[0]) - self.maxlines
+        if excess > 0:
+            self.delete("1.0", f"{excess + 1}.0")
         self.configure(state="disabled")
         self.see("end")
@@ -1,57 +1,89 @@
 import asyncio
 import logging
 import multiprocessing
+import socket
+import time
+from collections.abc import Callable
 from pathlib import Path
 
 from mitmproxy import ctx, log, optmanager
 
-from gfl2logger.gui import window
-from gfl2logger.gui.command import Command, CommandType
+from gfl2logger.gfl2 import data, metrics_server
+from gfl2logger.gui.command import HEADER, Command, CommandType
+from gfl2logger.gui.process import run_window
 from gfl2logger.utils import asyncio_utils
 from gfl2logger.utils.optmanager_wrapper import GFL2OptManagerWrapper
 
 logger = logging.getLogger(__name__)
 
+# seconds between updates of the stats panel
+STATS_INTERVAL = 1.0
+
 
 class GUIManager:
     def __init__(self):
-        self.from_gui: "multiprocessing.Queue[Command]" = multiprocessing.Queue()
-        self.to_gui: "multiprocessing.Queue[Command]" = multiprocessing.Queue()
+        # commands in both directions, see Command.encode
+        self.sock, child_sock = socket.socketpair()
+        # option metadata for the checkboxes, the window does not import data
+        options = [
+            {k: v for k, v in opt.items() if k != "typespec"}
+            for opt in data.get_options()
+        ]
         self.subprocess = multiprocessing.Process(
-            target=window.draw_window,
-            args=(self.from_gui, self.to_gui),
+            target=run_window,
+            args=(child_sock, options),
             name="TkWindow",
             daemon=True,
         )
-        self.log_handler = GuiLogHandler(self.to_gui)
+        self.child_sock: socket.socket | None = child_sock
+        self.writer: asyncio.StreamWriter | None = None
+        # commands sent before the channel is open
+        self.outbox: list[bytes] = []
+        # set once the GUI has closed its end
+        self.gone = asyncio.Event()
+        self.log_handler = GuiLogHandler(self.send)
         self.log_handler.install()
+        self.flush_task: asyncio.Task | None = None
+        self.stats_task: asyncio.Task | None = None
 
-    async def loop(self) -> None:
-        self.subprocess.start()
-        while self.subprocess.is_alive():
-            cmd = await asyncio.to_thread(self.from_gui.get, True)
-            match cmd.type:
-                case CommandType.OPTIONS:
-                    for opt in cmd.content:
-                        setattr(ctx.options, opt, cmd.content[opt])
-                case CommandType.SAVE_OPTIONS:
-                    filename = "gfl2logger.config.yaml"
-                    optmanager.save(
-                        self.optmanager_wrapper,
-                        Path(ctx.options.confdir).joinpath(filename),
-                        defaults=True,
-                    )
-                    logger.log(log.ALERT, f"Configurations saved to {filename}")
-                case CommandType.SHUTDOWN:
-                    break
-                case _:
-                    logger.warning(
-                        f"Unrecognized command from gui, cmd.type={cmd.type}, cmd.content={cmd.content}"
-                    )
+    def send(self, cmd: Command) -> None:
+        if self.writer is None:
+            self.outbox.append(cmd.encode())
+        elif not self.writer.is_closing():
+            self.writer.write(cmd.encode())
+
+    async def loop(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                type, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                cmd = Command.decode(type, await reader.readexactly(length))
+                match cmd.type:
+                    case CommandType.OPTIONS:
+                        for opt in cmd.content:
+                            setattr(ctx.options, opt, cmd.content[opt])
+                    case CommandType.SAVE_OPTIONS:
+                        filename = "gfl2logger.config.yaml"
+                        optmanager.save(
+                            self.optmanager_wrapper,
+                            Path(ctx.options.confdir).joinpath(filename),
+                            defaults=True,
+                        )
+                        logger.log(log.ALERT, f"Configurations saved to {filename}")
+                    case CommandType.SHUTDOWN:
+                        ctx.master.shutdown()
+                    case _:
+                        logger.warning(
+                            f"Unrecognized command from gui, cmd.type={cmd.type}, cmd.content={cmd.content}"
+                        )
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # the window process exited
+            pass
+        finally:
+            self.gone.set()
         ctx.master.shutdown()
 
     def configure(self, updated: set[str]) -> None:
-        self.to_gui.put(
+        self.send(
             Command(
                 CommandType.OPTIONS,
                 {
@@ -65,21 +97,94 @@ class GUIManager:
     def load(self, _) -> None:
         self.optmanager_wrapper = GFL2OptManagerWrapper(ctx.options)
 
+    async def flush_logs(self) -> None:
+        while True:
+            self.log_handler.flush()
+            await asyncio.sleep(self.log_handler.interval)
+
+    async def send_stats(self) -> None:
+        while True:
+            addon = ctx.master.addons.get("gfl2logger")
+            if addon is not None:
+                self.send(Command(CommandType.STATS, metrics_server.summary(addon)))
+            await asyncio.sleep(STATS_INTERVAL)
+
     async def running(self) -> None:
-        asyncio_utils.create_task(self.loop())
+        self.subprocess.start()
+        # the window process holds its own copy
+        self.child_sock.close()
+        self.child_sock = None
+
+        reader, self.writer = await asyncio.open_connection(sock=self.sock)
+        for b in self.outbox:
+            self.writer.write(b)
+        self.outbox.clear()
+        asyncio_utils.create_task(self.loop(reader))
+        self.flush_task = asyncio_utils.create_task(self.flush_logs())
+        self.stats_task = asyncio_utils.create_task(self.send_stats())
 
     async def done(self) -> None:
-        self.to_gui.put(Command(CommandType.SHUTDOWN, None))
-        self.subprocess.join(timeout=5)
-        self.subprocess.terminate()
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+        if self.stats_task is not None:
+            self.stats_task.cancel()
+        self.log_handler.flush()
+        if self.writer is not None:
+            self.send(Command(CommandType.SHUTDOWN, None))
+            try:
+                await self.writer.drain()
+                # the window closes its end once it is destroyed
+                await asyncio.wait_for(self.gone.wait(), timeout=5)
+            except (ConnectionError, TimeoutError):
+                pass
+            self.writer.close()
+        if self.subprocess.is_alive():
+            self.subprocess.join(timeout=1)
+            self.subprocess.terminate()
         self.log_handler.uninstall()
 
 
 class GuiLogHandler(log.MitmLogHandler):
-    def __init__(self, to_gui: "multiprocessing.Queue[Command]"):
+    """
+    Sends log records to the GUI in batches, one command per flush. Records
+    are limited to rate per second with bursts of up to burst records, the
+    excess is dropped without being formatted and reported as a count.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Command], None],
+        interval: float = 0.1,
+        rate: float = 50,
+        burst: int = 200,
+    ):
         super().__init__()
-        self.to_gui = to_gui
+        self.send = send
         self.formatter = log.MitmFormatter(False)
+        self.interval = interval
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.pending: list[str] = []
+        self.suppressed = 0
 
     def emit(self, record: logging.LogRecord):
-        self.to_gui.put(Command(CommandType.LOG, self.format(record)))
+        # called with self.lock held
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.refilled) * self.rate, self.burst)
+        self.refilled = now
+        if self.tokens < 1:
+            self.suppressed += 1
+            return
+        self.tokens -= 1
+        self.pending.append(self.format(record))
+
+    def flush(self) -> None:
+        with self.lock:
+            lines, self.pending = self.pending, []
+            if self.suppressed:
+                lines.append(f"{self.suppressed} messages suppressed")
+                self.suppressed = 0
+        if lines:
+            self.send(Command(CommandType.LOG, lines))
@@ -0,0 +1,12 @@
+import socket
+from typing import Any
+
+# Target of the GUI process. Spawning imports the module of the target in the
+# new interpreter, so this module must not import mitmproxy or the parser.
+
+
+def run_window(sock: socket.socket, options: list[dict[str, Any]]) -> None:
+    # Tk is only imported in the GUI process
+    from gfl2logger.gui import window
+
+    window.draw_window(sock, options)
@@ -1,24 +1,33 @@
+import collections
 import functools
 import multiprocessing
+import select
 import signal
-import threading
+import socket
 import tkinter
 from ctypes import windll
 from idlelib import tooltip
 from tkinter import ttk
+from typing import Any
 
-from embed import ICON_PNG
-from gfl2logger.gfl2 import data
+import embed
 from gfl2logger.gui.command import Command, CommandType
 from gfl2logger.gui.log_window import LogWindow
 
 logger = multiprocessing.get_logger()
 
+# milliseconds between reads of commands from the proxy
+DRAIN_INTERVAL = 100
+# reads of the socket in one drain, the rest waits for the next one
+DRAIN_READS = 16
+
 
 class TkWindow(tkinter.Tk):
-    def __init__(self, from_gui: "multiprocessing.Queue[Command]"):
-        self.from_gui = from_gui
-        self.active = True
+    def __init__(self, sock: socket.socket, options: list[dict[str, Any]]):
+        """options are the data options shown as checkboxes, see data.get_options."""
+        self.sock = sock
+        # bytes of an incomplete command
+        self.received = bytearray()
         self.options: dict[str, tkinter.Variable] = {}
 
         try:
@@ -30,18 +39,17 @@ class TkWindow(tkinter.Tk):
         self.title("gfl2logger")
         self.minsize(600, 240)
 
-        if ICON_PNG is not None:
-            self.iconphoto(True, tkinter.PhotoImage(data=ICON_PNG))
+        if embed.ICON_PNG is not None:
+            self.iconphoto(True, tkinter.PhotoImage(data=embed.ICON_PNG))
 
-        # exit flow: (tk) self.quit -> (tk) from_gui:SHUTDOWN
-        #   -> (main) master.shutdown -> (main) manager.done -> (main) to_gui:SHUTDOWN
-        #   -> (tk thread) <<Destroy>> -> (tk) self.destroy
+        # exit flow: (tk) self.quit -> (tk) sock:SHUTDOWN
+        #   -> (main) master.shutdown -> (main) manager.done -> (main) sock:SHUTDOWN
+        #   -> (tk) self.drain -> (tk) self.destroy -> (main) socket closed
         self.protocol("WM_DELETE_WINDOW", self.quit)
-        self.bind("<<Destroy>>", self.destroy)
 
         opt_frame = ttk.Frame(self, padding=10)
         opt_frame.pack(side="left", fill="y")
-        for opt in data.get_options():
+        for opt in options:
             if "name" not in opt:
                 continue
             match opt.get("default"):
@@ -66,54 +74,90 @@ class TkWindow(tkinter.Tk):
             side="bottom", anchor="e"
         )
 
+        stats_frame = ttk.LabelFrame(opt_frame, text="Stats", padding=5)
+        stats_frame.pack(side="bottom", fill="x", pady=(10, 10))
+        self.stats = ttk.Label(stats_frame, justify="left")
+        self.stats.pack(anchor="w")
+
         self.log_win = LogWindow(self, width=50, height=10, wrap="word")
         self.log_win.pack(fill="both", expand=True)
 
+        # received lines not shown yet, older ones would be trimmed anyway
+        self.log_lines: collections.deque[str] = collections.deque(
+            maxlen=self.log_win.maxlines
+        )
+        self.after(DRAIN_INTERVAL, self.drain)
+
+    def send(self, cmd: Command) -> None:
+        try:
+            self.sock.sendall(cmd.encode())
+        except OSError as e:
+            logger.warning(f"Unable to reach the proxy, error={e}")
+            self.destroy()
+
     def cmd_change_options(self, opt: str) -> None:
-        self.from_gui.put(Command(CommandType.OPTIONS, {opt: self.options[opt].get()}))
+        self.send(Command(CommandType.OPTIONS, {opt: self.options[opt].get()}))
 
     def cmd_save_options(self) -> None:
-        self.from_gui.put(Command(CommandType.SAVE_OPTIONS, None))
+        self.send(Command(CommandType.SAVE_OPTIONS, None))
 
-    def rpc_write_log(self, msg: str) -> None:
-        self.log_win.write(msg)
+    def rpc_write_log(self, msgs: list[str]) -> None:
+        self.log_lines.extend(msgs)
 
     def rpc_set_options(self, options: dict[str, bool]) -> None:
         for opt in options:
             if opt in self.options:
                 self.options[opt].set(options[opt])
 
+    def rpc_set_stats(self, stats: dict[str, int]) -> None:
+        self.stats.configure(
+            text="\n".join(f"{name}: {value}" for name, value in stats.items())
+        )
+
+    def drain(self) -> None:
+        try:
+            for _ in range(DRAIN_READS):
+                if not select.select([self.sock], [], [], 0)[0]:
+                    break
+                b = self.sock.recv(65536)
+                if not b:
+                    # the proxy exited
+                    self.destroy()
+                    return
+                self.received += b
+        except OSError as e:
+            logger.warning(f"Unable to reach the proxy, error={e}")
+            self.destroy()
+            return
+
+        for cmd in Command.decode_all(self.received):
+            match cmd.type:
+                case CommandType.LOG:
+                    self.rpc_write_log(cmd.content)
+                case CommandType.OPTIONS:
+                    self.rpc_set_options(cmd.content)
+                case CommandType.STATS:
+                    self.rpc_set_stats(cmd.content)
+                case CommandType.SHUTDOWN:
+                    self.destroy()
+                    return
+                case _:
+                    logger.warning(
+                        f"Unrecognized command to gui, cmd.type={cmd.type}, cmd.content={cmd.content}"
+                    )
+
+        lines = list(self.log_lines)
+        self.log_lines.clear()
+        self.log_win.write_lines(lines)
+        self.after(DRAIN_INTERVAL, self.drain)
+
     def quit(self) -> None:
         self.withdraw()
-        self.from_gui.put(Command(CommandType.SHUTDOWN, None))
-
-    def destroy(self, *_) -> None:
-        super().destroy()
-
-
-def loop(window: TkWindow, to_gui: multiprocessing.Queue) -> None:
-    while window.active:
-        cmd = to_gui.get()
-        match cmd.type:
-            case CommandType.LOG:
-                window.rpc_write_log(cmd.content)
-            case CommandType.OPTIONS:
-                window.rpc_set_options(cmd.content)
-            case CommandType.SHUTDOWN:
-                window.active = False
-                window.event_generate("<<Destroy>>")
-                break
-            case _:
-                logger.warning(
-                    f"Unrecognized command to gui, cmd.type={cmd.type}, cmd.content={cmd.content}"
-                )
-
-
-def draw_window(
-    from_gui: "multiprocessing.Queue[Command]",
-    to_gui: "multiprocessing.Queue[Command]",
-) -> None:
-    window = TkWindow(from_gui)
+        self.send(Command(CommandType.SHUTDOWN, None))
+
+
+def draw_window(sock: socket.socket, options: list[dict[str, Any]]) -> None:
+    window = TkWindow(sock, options)
 
     def _sigint(*_):
         window.quit()
@@ -124,7 +168,5 @@ def draw_window(
     signal.signal(signal.SIGINT, _sigint)
     signal.signal(signal.SIGTERM, _sigterm)
 
-    t = threading.Thread(target=loop, args=(window, to_gui), daemon=True)
-    t.start()
     window.mainloop()
-    t.join(timeout=3)
+    sock.close()
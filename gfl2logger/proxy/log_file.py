@@ -0,0 +1,66 @@
+import logging
+import logging.handlers
+import sys
+
+from mitmproxy import addonmanager, ctx, exceptions
+
+# the log file is rotated at this size, keeping BACKUPS older files
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 3
+
+
+class LogFile:
+    """
+    Writes the log to gfl2_log_file, or to stderr when running headless
+    without a log file. The window shows the log otherwise.
+    """
+
+    def __init__(self):
+        self.handler: logging.Handler | None = None
+
+    def load(self, loader: addonmanager.Loader) -> None:
+        loader.add_option(
+            name="gfl2_log_file",
+            typespec=str,
+            default="",
+            help="Write the log to this file, rotated every 10 MB. Headless runs log to stderr when empty",
+        )
+
+    def configure(self, updated: set[str]) -> None:
+        if "gfl2_log_file" not in updated and "gfl2_headless" not in updated:
+            return
+
+        handler: logging.Handler
+        if ctx.options.gfl2_log_file:
+            try:
+                handler = logging.handlers.RotatingFileHandler(
+                    ctx.options.gfl2_log_file,
+                    maxBytes=MAX_BYTES,
+                    backupCount=BACKUPS,
+                    encoding="utf-8",
+                )
+            except OSError as e:
+                raise exceptions.OptionsError(
+                    f"Unable to open {ctx.options.gfl2_log_file}, error={e}"
+                )
+        elif ctx.options.gfl2_headless and sys.stderr is not None:
+            handler = logging.StreamHandler(sys.stderr)
+        else:
+            self.uninstall()
+            return
+
+        handler.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+        self.uninstall()
+        logging.getLogger().addHandler(handler)
+        self.handler = handler
+
+    def uninstall(self) -> None:
+        if self.handler is not None:
+            logging.getLogger().removeHandler(self.handler)
+            self.handler.close()
+            self.handler = None
+
+    def done(self) -> None:
+        self.uninstall()
@@ -1,33 +1,66 @@
+import logging
+import time
 from collections.abc import Sequence
 from pathlib import Path
 
-from mitmproxy import master, options, optmanager
+from mitmproxy import hooks, master, options, optmanager
 from mitmproxy.addons import next_layer, proxyserver
 
 from gfl2logger.gfl2.logger import GFL2Logger
-from gfl2logger.gui.manager import GUIManager
 from gfl2logger.proxy.ignore_tls import IgnoreTls
+from gfl2logger.proxy.log_file import LogFile
 
-addons = [
-    GFL2Logger(),
-    GUIManager(),
-    IgnoreTls(),
-    next_layer.NextLayer(),
-    proxyserver.Proxyserver(),
-]
+logger = logging.getLogger(__name__)
 
 
 class ProxyMaster(master.Master):
-    def __init__(self):
+    def __init__(self, headless: bool | None = None, started: float | None = None):
+        """
+        headless runs without the window, None leaves it to gfl2_headless in
+        gfl2logger.config.yaml.
+        """
         opts = options.Options()
         opts.add_option("mode", Sequence[str], ["local:GF2_Exilium"], help="")
         opts.add_option("http2", bool, False, help="")
         opts.add_option("http3", bool, False, help="")
         opts.add_option("websocket", bool, False, help="")
         opts.add_option("confdir", str, str(Path.cwd()), help="")
+        opts.add_option(
+            "gfl2_headless",
+            bool,
+            False,
+            help="Run without the window, read at startup",
+        )
 
         super().__init__(opts, with_termlog=False)
-        self.addons.add(*addons)
+        # perf_counter() at process start, for time-to-listening
+        self.started = time.perf_counter() if started is None else started
+        self.time_to_listening: float | None = None
+
+        self.addons.add(
+            GFL2Logger(),
+            LogFile(),
+            IgnoreTls(),
+            next_layer.NextLayer(),
+            proxyserver.Proxyserver(),
+        )
         optmanager.load_paths(
             opts, Path(opts.confdir).joinpath("gfl2logger.config.yaml")
         )
+        if headless is not None:
+            opts.update(gfl2_headless=headless)
+
+        if not opts.gfl2_headless:
+            # the GUI modules are only imported when a window is wanted
+            from gfl2logger.gui.manager import GUIManager
+
+            gui = GUIManager()
+            self.addons.add(gui)
+            # the config file was applied before it was added
+            self.addons.invoke_addon_sync(gui, hooks.ConfigureHook(set(opts.keys())))
+
+    async def running(self) -> None:
+        # proxy servers are set up before the running hook
+        self.time_to_listening = time.perf_counter() - self.started
+        logger.info(f"Listening after {self.time_to_listening:.3f}s")
+        await super().running()
@@ -1,17 +1,25 @@
+import argparse
 import asyncio
 import logging
 import multiprocessing
 import signal
 import sys
+import time
 
-from mitmproxy import log
+# reported as time-to-listening once the proxy is up
+STARTED = time.perf_counter()
 
-from gfl2logger.proxy.master import ProxyMaster
 
+async def run(args: argparse.Namespace) -> None:
+    # imported here, the GUI process imports this module too when it is spawned
+    from mitmproxy import log
 
-async def run() -> None:
-    logging.getLogger().setLevel(log.ALERT)
-    m = ProxyMaster()
+    from gfl2logger.proxy.master import ProxyMaster
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else log.ALERT)
+    m = ProxyMaster(headless=True if args.headless else None, started=STARTED)
+    if args.log_file:
+        m.options.update(gfl2_log_file=args.log_file)
     loop = asyncio.get_running_loop()
 
     def _sigint(*_):
@@ -34,7 +42,22 @@ async def run() -> None:
 
 
 def main() -> None:
-    asyncio.run(run())
+    parser = argparse.ArgumentParser(
+        description="Log GFL2 game data from the client's traffic"
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="run without the window, same as gfl2_headless: true in gfl2logger.config.yaml",
+    )
+    parser.add_argument(
+        "--log-file",
+        help="write the log to this file, rotated every 10 MB, instead of stderr when headless",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="log informational messages"
+    )
+    asyncio.run(run(parser.parse_args()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,363 @@
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any
+
+from mitmproxy import connection, exceptions, io, master, options, optmanager, tcp
+
+from gfl2logger.gfl2 import classifier
+from gfl2logger.gfl2.capture import EXTENSION, CaptureReader
+from gfl2logger.gfl2.logger import GFL2Logger
+
+logger = logging.getLogger(__name__)
+
+# replayed bytes between samples of current_rss()
+RSS_SAMPLE_BYTES = 4 << 20
+
+
+@dataclasses.dataclass
+class Result:
+    path: str
+    streams: int = 0
+    bytes: int = 0
+    frames: int = 0
+    # seconds spent framing and parsing, exports are written concurrently
+    parse_time: float = 0.0
+    # seconds until every export of the file was written
+    total_time: float = 0.0
+    # peak resident set size of the replaying process in bytes, processes
+    # replay several files in turn so this is the peak up to this file
+    max_rss: int = 0
+    # (bytes replayed, current_rss()) every RSS_SAMPLE_BYTES and at both ends
+    rss_samples: list[tuple[int, int]] = dataclasses.field(default_factory=list)
+    error: str = ""
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes / 1e6 / self.parse_time if self.parse_time else 0.0
+
+    @property
+    def frames_per_s(self) -> float:
+        return self.frames / self.parse_time if self.parse_time else 0.0
+
+    @property
+    def rss_slope(self) -> float:
+        """
+        Growth of current_rss() in bytes per replayed MB, by least squares.
+        Flat memory is close to 0 over a long replay, short ones are dominated
+        by modules loaded on the first payloads.
+        """
+        if len({b for b, _ in self.rss_samples}) < 2:
+            return 0.0
+        x, y = zip(*self.rss_samples)
+        return statistics.linear_regression(x, y).slope * 1e6
+
+
+def memory_counters() -> Any:
+    """PROCESS_MEMORY_COUNTERS of this process on Windows, None if unavailable."""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(
+        process, ctypes.byref(counters), counters.cb
+    ):
+        return None
+    return counters
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes, 0 if unknown."""
+    if sys.platform == "win32":
+        counters = memory_counters()
+        return counters.PeakWorkingSetSize if counters else 0
+
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def current_rss() -> int:
+    """
+    Memory held by this process in bytes right now, 0 if unknown. Only private
+    memory is counted, pages of the memory-mapped capture file are not, so it
+    follows what the proxy retains.
+    """
+    if sys.platform == "win32":
+        counters = memory_counters()
+        # private committed bytes
+        return counters.PagefileUsage if counters else 0
+
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def read_streams(path: str) -> Iterator[Iterator[bytes]]:
+    """
+    Yields the server messages of each game flow in a capture file or flow dump.
+    Messages of capture files are read as they are consumed, so what stays in
+    memory is up to the proxy like on a live flow.
+    """
+    if path.endswith(EXTENSION):
+        with CaptureReader(path) as reader:
+            yield (bytes(view) for _, view in reader.records())
+        return
+
+    with open(path, "rb") as f:
+        for flow in io.FlowReader(f).stream():
+            if not isinstance(flow, tcp.TCPFlow):
+                continue
+            messages = [m.content for m in flow.messages if not m.from_client]
+            head = b"".join(messages)[: classifier.SNIFF_MAX]
+            if classifier.sniff(head):
+                yield iter(messages)
+
+
+def segments(messages: Iterator[bytes], size: int) -> Iterator[bytes]:
+    """Re-splits a stream into segments of size bytes, 0 keeps the recorded messages."""
+    if size <= 0:
+        yield from messages
+        return
+    buffer = bytearray()
+    for content in messages:
+        buffer += content
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def set_options(opts: optmanager.OptManager, specs: Sequence[str]) -> None:
+    """OptManager.set for option=value specs, which also parses float options."""
+    types = {name: o.typespec for name, o in opts.items()}
+    rest = []
+    for spec in specs:
+        name, sep, value = spec.partition("=")
+        if not sep or types.get(name) is not float:
+            rest.append(spec)
+            continue
+        try:
+            opts.update(**{name: float(value)})
+        except ValueError:
+            raise exceptions.OptionsError(f"Not a number: {spec}") from None
+    if rest:
+        opts.set(*rest)
+
+
+def replay_flow() -> tcp.TCPFlow:
+    client = connection.Client(peername=("127.0.0.1", 0), sockname=("127.0.0.1", 0))
+    server = connection.Server(address=None)
+    return tcp.TCPFlow(client, server, live=True)
+
+
+async def replay(path: str, segment: int, sets: Sequence[str]) -> Result:
+    opts = options.Options()
+    m = master.Master(opts)
+    addon = GFL2Logger()
+    m.addons.add(addon)
+
+    result = Result(path)
+    start = time.perf_counter()
+    try:
+        set_options(opts, sets)
+        await m.running()
+        result.rss_samples.append((0, current_rss()))
+        next_sample = RSS_SAMPLE_BYTES
+        for messages in read_streams(path):
+            # fed through the addon hooks, so flow.messages is kept the way
+            # gfl2_flow_history keeps it on a live flow
+            flow = replay_flow()
+            await addon.tcp_start(flow)
+            parser = None
+            for content in segments(messages, segment):
+                flow.messages.append(tcp.TCPMessage(False, content))
+                t = time.perf_counter()
+                await addon.tcp_message(flow)
+                result.parse_time += time.perf_counter() - t
+                result.bytes += len(content)
+                if result.bytes >= next_sample:
+                    result.rss_samples.append((result.bytes, current_rss()))
+                    next_sample = result.bytes + RSS_SAMPLE_BYTES
+                # let exports start between segments as they would on a live flow
+                await asyncio.sleep(0)
+                if parser is None:
+                    parser = addon.active_flows.get(flow)
+            await addon.tcp_end(flow)
+            if parser is not None:
+                result.frames += parser.frames
+            result.streams += 1
+        result.rss_samples.append((result.bytes, current_rss()))
+    finally:
+        await m.done()
+    result.total_time = time.perf_counter() - start
+    result.max_rss = peak_rss()
+    return result
+
+
+def replay_file(path: str, segment: int, output: str, sets: Sequence[str]) -> Result:
+    # exports are written to the working directory, keep each input apart
+    directory = os.path.join(output, os.path.splitext(os.path.basename(path))[0])
+    cwd = os.getcwd()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        os.chdir(directory)
+        return asyncio.run(replay(path, segment, sets))
+    except Exception as e:
+        logger.error(f"Replay failed, path={path}, exception={e}")
+        return Result(path, error=str(e))
+    finally:
+        os.chdir(cwd)
+
+
+def init_worker(level: int) -> None:
+    logging.basicConfig(level=level, format="%(levelname)s %(name)s %(message)s")
+
+
+def report(results: list[Result], elapsed: float) -> None:
+    for r in results:
+        if r.error:
+            print(f"{r.path}: error={r.error}")
+            continue
+        print(
+            f"{r.path}: streams={r.streams}, bytes={r.bytes}, frames={r.frames}, "
+            f"parse={r.parse_time:.3f}s, {r.mb_per_s:.1f} MB/s, {r.frames_per_s:.0f} frames/s, "
+            f"total={r.total_time:.3f}s, max_rss={r.max_rss / 1e6:.1f} MB, "
+            f"rss={r.rss_samples[0][1] / 1e6:.1f}->{r.rss_samples[-1][1] / 1e6:.1f} MB, "
+            f"rss_slope={r.rss_slope / 1e3:.1f} KB/MB"
+        )
+
+    total_bytes = sum(r.bytes for r in results)
+    total_frames = sum(r.frames for r in results)
+    print(
+        f"Replayed {len(results)} files, bytes={total_bytes}, frames={total_frames}, "
+        f"elapsed={elapsed:.3f}s, {total_bytes / 1e6 / elapsed:.1f} MB/s, "
+        f"{total_frames / elapsed:.0f} frames/s"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Replay recorded server streams through the parser and exporters"
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help=f"capture files ({EXTENSION}) or mitmproxy flow dumps",
+    )
+    parser.add_argument(
+        "-s",
+        "--segment",
+        type=int,
+        default=0,
+        help="split streams into segments of this many bytes, 0 keeps the recorded messages",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of files replayed in parallel processes",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="replay",
+        help="directory for exported files, with one subdirectory per input",
+    )
+    parser.add_argument(
+        "--set",
+        dest="sets",
+        action="append",
+        default=[],
+        metavar="OPTION=VALUE",
+        help="set a gfl2logger option, e.g. gfl2_output_format=ndjson",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="print one JSON object per file instead of a summary",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="log parser and export details"
+    )
+    args = parser.parse_args()
+
+    level = logging.DEBUG if args.verbose else logging.WARNING
+    init_worker(level)
+    paths = [os.path.abspath(p) for p in args.paths]
+    output = os.path.abspath(args.output)
+    jobs = max(min(args.jobs, len(paths)), 1)
+
+    start = time.perf_counter()
+    if jobs == 1:
+        results = [replay_file(p, args.segment, output, args.sets) for p in paths]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=init_worker, initargs=(level,)
+        ) as pool:
+            results = list(
+                pool.map(
+                    replay_file,
+                    paths,
+                    repeat(args.segment),
+                    repeat(output),
+                    repeat(args.sets),
+                )
+            )
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        for r in results:
+            print(
+                json.dumps(
+                    {
+                        **dataclasses.asdict(r),
+                        "mb_per_s": r.mb_per_s,
+                        "frames_per_s": r.frames_per_s,
+                        "rss_slope": r.rss_slope,
+                    }
+                )
+            )
+    else:
+        report(results, elapsed)
+    return 1 if any(r.error for r in results) else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())